@@ -0,0 +1,105 @@
+import argparse
+import functools
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import QRCodeDetection
+from Instrumentation import StageProfiler
+
+
+# Headless batch mode of the QR code detection: scans every png file of a directory or glob pattern on a process
+# pool and writes one JSON object per image and line, e.g.
+#
+#   python BatchScanner.py images/covid19QRCode/challenging/ --output results.jsonl
+#
+# Every record holds the file name, image size, bounding box of the largest component, its size and the time taken
+# by every stage; images that cannot be processed get an "error" entry instead of stopping the batch. With --profile
+# every record also gets a "profile" entry with CPU time and throughput per stage, and with --profile-memory also
+# the peak memory of every stage, which makes the scan several times slower (see Instrumentation.py).
+
+
+def findImages(paths, recursive = False):
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            pattern = os.path.join(path, "**", "*.png") if recursive else os.path.join(path, "*.png")
+            filenames.extend(sorted(glob.glob(pattern, recursive=recursive)))
+        else:
+            filenames.extend(sorted(glob.glob(path, recursive=True)))
+    return filenames
+
+
+def scanImage(input_filename, smoothing_repeat = 9, threshold_value = 70, dilation_number = 1, erosion_number = 1,
+              profile = False, profile_memory = False, fused_smoothing = False):
+    record = {"file": input_filename}
+    profiler = StageProfiler(trace_memory=profile_memory) if profile or profile_memory else None
+    try:
+        result = QRCodeDetection.detect_qr(input_filename, smoothing_repeat, threshold_value, dilation_number,
+                                           erosion_number, profiler=profiler, fused_smoothing=fused_smoothing)
+        record.update(result.as_dict())
+    except Exception as error:
+        message = str(error)
+        if not message.startswith(type(error).__name__):
+            message = "{}: {}".format(type(error).__name__, message)
+        record["error"] = message
+        record["timings"] = {}
+
+    record["timings"] = {stage: round(seconds, 6) for (stage, seconds) in record["timings"].items()}
+    record["total_time"] = round(sum(record["timings"].values()), 6)
+    if profiler is not None:
+        record["profile"] = profiler.as_dict()
+    return record
+
+
+def initializeWorker(backend):
+    QRCodeDetection.setBackend(backend)
+
+
+# scans the images on a pool of `processes` worker processes and writes a JSON line to output_file as soon as an
+# image is done (so records are in completion order); returns the number of images scanned
+def scanImages(filenames, output_file, processes = None, backend = "python", profile = False,
+               profile_memory = False, fused_smoothing = False):
+    count = 0
+    scan = functools.partial(scanImage, profile=profile, profile_memory=profile_memory,
+                             fused_smoothing=fused_smoothing)
+    with multiprocessing.Pool(processes, initializer=initializeWorker, initargs=(backend,)) as pool:
+        for record in pool.imap_unordered(scan, filenames, chunksize=1):
+            output_file.write(json.dumps(record) + "\n")
+            output_file.flush()
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect QR codes in many png images and write JSON lines.")
+    parser.add_argument("paths", nargs="+", help="directories or glob patterns of png files")
+    parser.add_argument("--output", default="-", help="JSON lines output file, - for standard output")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--backend", choices=["python", "numpy"], default="python")
+    parser.add_argument("--recursive", action="store_true", help="also scan subdirectories of directories")
+    parser.add_argument("--profile", action="store_true", help="record CPU time and throughput per stage")
+    parser.add_argument("--profile-memory", action="store_true", help="also record peak memory per stage (slow)")
+    parser.add_argument("--fused-smoothing", action="store_true",
+                        help="faster single pass smoothing, may change results by a few pixels")
+    arguments = parser.parse_args()
+
+    filenames = findImages(arguments.paths, arguments.recursive)
+    start = time.perf_counter()
+    if arguments.output == "-":
+        count = scanImages(filenames, sys.stdout, arguments.processes, arguments.backend,
+                           arguments.profile, arguments.profile_memory, arguments.fused_smoothing)
+    else:
+        with open(arguments.output, "w") as output_file:
+            count = scanImages(filenames, output_file, arguments.processes, arguments.backend,
+                               arguments.profile, arguments.profile_memory, arguments.fused_smoothing)
+    elapsed = time.perf_counter() - start
+
+    print("scanned {} images in {:.2f}s".format(count, elapsed), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import argparse
+import glob
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Performance benchmarks for the QR code detection, run from the command line:
+#
+#   python Benchmark.py startup [--module QRCodeDetection] [--repeat 20]
+#   python Benchmark.py suite [--sizes 1,4] [--repeat 5] [--backend python] [--save baseline.json] [--compare ...]
+#   python Benchmark.py decode [--repeat 5] [images ...]
+#
+# startup measures the cold start of importing a module in a fresh interpreter, which is what every worker process
+# and command line run pays before doing any work.
+#
+# suite times decoding (imageIO.png.Reader), every stage of detect_qr and the whole detection on the bundled images
+# and on synthetic upscaled versions of poster1small.png (by default with 1 and 4 megapixels), and reports the median
+# and 95th percentile of every measurement and the pixels per second of the median. --save writes the results to a
+# JSON file; --compare reads such a file and reports every measurement whose median got slower than the tolerance
+# allows, with exit status 1 if there is one. Synthetic images are written once to a cache directory. The default run
+# takes about ten minutes with the python backend; larger sizes such as --sizes 1,4,16 take most of an hour with it
+# and are better measured with --backend numpy.
+#
+# decode times the ways imageIO.png.Reader can decode a whole image (by default the challenging images): read() with
+# every row consumed, read_packed() and read_flat().
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# modules that should not be loaded by a plain import of the detection modules
+HEAVY_MODULES = ["matplotlib", "numpy", "imageIO.png"]
+
+STARTUP_CODE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(" ".join(name for name in {heavy_modules!r} if name in sys.modules))
+"""
+
+
+# Imports module_name in `repeat` fresh interpreters. Returns the import times and the total process times in
+# seconds, and the heavy modules that the import loaded.
+def measureStartup(module_name, repeat = 20):
+    code = STARTUP_CODE.format(module=module_name, heavy_modules=HEAVY_MODULES)
+
+    import_times = []
+    process_times = []
+    loaded_modules = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], cwd=REPOSITORY_DIRECTORY, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        process_times.append(time.perf_counter() - start)
+
+        lines = output.splitlines()
+        import_times.append(float(lines[0]))
+        loaded_modules = lines[1].split() if len(lines) > 1 else []
+
+    return (import_times, process_times, loaded_modules)
+
+
+def reportStartup(module_name, repeat):
+    (import_times, process_times, loaded_modules) = measureStartup(module_name, repeat)
+
+    print("import {}: median {:.1f} ms, min {:.1f} ms ({} runs)".format(
+        module_name, statistics.median(import_times) * 1000, min(import_times) * 1000, repeat))
+    print("interpreter start + import: median {:.1f} ms, min {:.1f} ms".format(
+        statistics.median(process_times) * 1000, min(process_times) * 1000))
+    print("heavy modules loaded: {}".format(", ".join(loaded_modules) or "none"))
+    if sys.flags.dont_write_bytecode:
+        print("note: bytecode writing is disabled (PYTHONDONTWRITEBYTECODE), times include compiling the modules "
+              "unless they were compiled with python -m compileall")
+
+
+SYNTHETIC_SOURCE = os.path.join(REPOSITORY_DIRECTORY, "images", "covid19QRCode", "poster1small.png")
+
+
+def bundledImages():
+    return sorted(glob.glob(os.path.join(REPOSITORY_DIRECTORY, "images", "**", "*.png"), recursive=True))
+
+
+# Writes (if not cached yet) an RGB png of about megapixels million pixels, scaled from source_filename with nearest
+# neighbour interpolation, and returns its file name.
+def syntheticImage(megapixels, cache_directory, source_filename = SYNTHETIC_SOURCE):
+    import imageIO.png
+
+    output_filename = os.path.join(cache_directory, "synthetic_{}mp.png".format(megapixels))
+    if os.path.exists(output_filename):
+        return output_filename
+
+    (width, height, rows, info) = imageIO.png.Reader(filename=source_filename).asRGB8()
+    rows = [bytes(row) for row in rows]
+    scale = math.sqrt(megapixels * 1e6 / (width * height))
+    (new_width, new_height) = (round(width * scale), round(height * scale))
+    columns = [3 * (x * width // new_width) + channel for x in range(new_width) for channel in range(3)]
+
+    def scaledRows():
+        for y in range(new_height):
+            row = rows[y * height // new_height]
+            yield bytes([row[column] for column in columns])
+
+    os.makedirs(cache_directory, exist_ok=True)
+    temporary_filename = output_filename + ".tmp"
+    with open(temporary_filename, "wb") as output_file:
+        imageIO.png.Writer(new_width, new_height, greyscale=False).write(output_file, scaledRows())
+    os.replace(temporary_filename, output_filename)
+    return output_filename
+
+
+# nearest-rank percentile of a list of values
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(times, pixels):
+    median = statistics.median(times)
+    return {"runs": len(times),
+            "median": median,
+            "p95": percentile(times, 0.95),
+            "pixels": pixels,
+            "pixels_per_second": pixels / median if median > 0 else 0.0}
+
+
+# Runs detect_qr `repeat` times on every image. Returns {image name: {measurement: summary}}, where the
+# measurements are "decode", every stage of detect_qr and "end_to_end".
+def runSuite(filenames, repeat = 5):
+    import QRCodeDetection
+    from Instrumentation import StageProfiler
+
+    results = {}
+    for filename in filenames:
+        times = {}
+        pixels = 0
+        for i in range(repeat):
+            profiler = StageProfiler(trace_memory=False)
+            start = time.perf_counter()
+            result = QRCodeDetection.detect_qr(filename, profiler=profiler)
+            end_to_end = time.perf_counter() - start
+
+            pixels = result.width * result.height
+            for (name, record) in profiler.stages.items():
+                times.setdefault(name, []).append(record.wall_time)
+            times.setdefault("end_to_end", []).append(end_to_end)
+
+        name = os.path.relpath(filename, REPOSITORY_DIRECTORY) if filename.startswith(REPOSITORY_DIRECTORY) else \
+            os.path.basename(filename)
+        results[name] = {measurement: summarize(measurement_times, pixels)
+                         for (measurement, measurement_times) in times.items()}
+        print("{}: {:.3f} s".format(name, results[name]["end_to_end"]["median"]), file=sys.stderr)
+    return results
+
+
+def formatSuite(results):
+    lines = ["{:<50} {:<20} {:>10} {:>10} {:>10}".format("image", "measurement", "median ms", "p95 ms", "Mpx/s")]
+    for (name, measurements) in results.items():
+        for (measurement, summary) in measurements.items():
+            lines.append("{:<50} {:<20} {:>10.1f} {:>10.1f} {:>10.2f}".format(
+                name, measurement, summary["median"] * 1000, summary["p95"] * 1000,
+                summary["pixels_per_second"] / 1e6))
+    return "\n".join(lines)
+
+
+# Returns a list of (image, measurement, baseline median, median) for every measurement present in both results
+# that got slower than baseline median * (1 + tolerance).
+def compareSuite(results, baseline, tolerance = 0.1):
+    regressions = []
+    for (name, measurements) in results.items():
+        for (measurement, summary) in measurements.items():
+            baseline_summary = baseline.get(name, {}).get(measurement)
+            if baseline_summary is not None and summary["median"] > baseline_summary["median"] * (1 + tolerance):
+                regressions.append((name, measurement, baseline_summary["median"], summary["median"]))
+    return regressions
+
+
+def reportSuite(sizes, repeat, backend, cache_directory, save_filename, compare_filename, tolerance):
+    import QRCodeDetection
+    QRCodeDetection.setBackend(backend)
+
+    filenames = bundledImages() + [syntheticImage(megapixels, cache_directory) for megapixels in sizes]
+    results = runSuite(filenames, repeat)
+    print(formatSuite(results))
+
+    if save_filename is not None:
+        with open(save_filename, "w") as output_file:
+            json.dump({"backend": backend, "repeat": repeat, "results": results}, output_file, indent=2)
+
+    if compare_filename is not None:
+        with open(compare_filename) as input_file:
+            baseline = json.load(input_file)
+        regressions = compareSuite(results, baseline["results"], tolerance)
+        for (name, measurement, baseline_median, median) in regressions:
+            print("REGRESSION {} {}: {:.1f} ms -> {:.1f} ms ({:+.0%})".format(
+                name, measurement, baseline_median * 1000, median * 1000, median / baseline_median - 1))
+        if not regressions:
+            print("no regressions against {} (tolerance {:.0%})".format(compare_filename, tolerance))
+        return len(regressions) == 0
+
+    return True
+
+
+CHALLENGING_IMAGES = os.path.join(REPOSITORY_DIRECTORY, "images", "covid19QRCode", "challenging", "*.png")
+
+
+def consumeRows(rows):
+    for row in rows:
+        pass
+
+
+DECODE_METHODS = [("read", lambda reader: consumeRows(reader.read()[2])),
+                  ("read_packed", lambda reader: reader.read_packed()),
+                  ("read_flat", lambda reader: reader.read_flat())]
+
+
+# Returns {image name: {method: summary}} for the decode methods that the Reader has.
+def runDecode(filenames, repeat = 5):
+    import imageIO.png
+
+    results = {}
+    for filename in filenames:
+        reader = imageIO.png.Reader(filename=filename)
+        reader.preamble()
+        pixels = reader.width * reader.height
+
+        measurements = {}
+        for (method, decode) in DECODE_METHODS:
+            if not hasattr(imageIO.png.Reader, method):
+                continue
+            times = []
+            for i in range(repeat):
+                reader = imageIO.png.Reader(filename=filename)
+                start = time.perf_counter()
+                decode(reader)
+                times.append(time.perf_counter() - start)
+            measurements[method] = summarize(times, pixels)
+        results[os.path.basename(filename)] = measurements
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the QR code detection.")
+    subparsers = parser.add_subparsers(dest="benchmark")
+    subparsers.required = True
+
+    startup_parser = subparsers.add_parser("startup", help="cold start time of importing a module")
+    startup_parser.add_argument("--module", default="QRCodeDetection")
+    startup_parser.add_argument("--repeat", type=int, default=20)
+
+    suite_parser = subparsers.add_parser("suite", help="decode, stage and end-to-end times on the bundled and "
+                                                       "synthetic images")
+    suite_parser.add_argument("--sizes", default="1,4", help="megapixels of the synthetic images, e.g. 1,4,16")
+    suite_parser.add_argument("--repeat", type=int, default=5)
+    suite_parser.add_argument("--backend", choices=["python", "numpy"], default="python")
+    suite_parser.add_argument("--cache", default=os.path.join(tempfile.gettempdir(), "qrcode-benchmark"),
+                              help="directory for the synthetic images")
+    suite_parser.add_argument("--save", help="write the results to this JSON file")
+    suite_parser.add_argument("--compare", help="compare with results saved with --save")
+    suite_parser.add_argument("--tolerance", type=float, default=0.1,
+                              help="allowed slowdown of a median before it counts as a regression")
+
+    decode_parser = subparsers.add_parser("decode", help="decode times of the png reader methods")
+    decode_parser.add_argument("images", nargs="*", help="png files (default: the challenging images)")
+    decode_parser.add_argument("--repeat", type=int, default=5)
+
+    arguments = parser.parse_args()
+
+    if arguments.benchmark == "startup":
+        reportStartup(arguments.module, arguments.repeat)
+    elif arguments.benchmark == "suite":
+        sizes = [int(size) for size in arguments.sizes.split(",") if size]
+        if not reportSuite(sizes, arguments.repeat, arguments.backend, arguments.cache, arguments.save,
+                           arguments.compare, arguments.tolerance):
+            sys.exit(1)
+    elif arguments.benchmark == "decode":
+        filenames = arguments.images or sorted(glob.glob(CHALLENGING_IMAGES))
+        print(formatSuite(runDecode(filenames, arguments.repeat)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+from array import array
+
+from PixelArray import PixelArray
+
+
+# bytes.translate tables between one byte per pixel (0 or 1) and the characters of a binary number
+PACK_TABLE = bytes.maketrans(b'\x00\x01', b'01')
+UNPACK_TABLE = bytes.maketrans(b'01', b'\x00\x01')
+
+
+# packs one row into an int, with bit x set where row[x] >= threshold_value
+def packRow(row, threshold_value = 1):
+    flags = bytes([1 if value >= threshold_value else 0 for value in row])
+    # the last pixel is the most significant bit
+    return int(flags[::-1].translate(PACK_TABLE) or b'0', 2)
+
+
+# The two halves of the 3x3 morphology on bit-packed rows, shared with the streaming pipeline: a row is dilated
+# (eroded) horizontally by OR-ing (AND-ing) it with itself shifted one column either way, mask keeping the result
+# within the image width; the output row then combines the horizontally filtered rows above, at and below it, with 0
+# for rows outside the image.
+def dilateRow(row, mask):
+    return (row | (row << 1) | (row >> 1)) & mask
+
+
+def dilateRows(above, row, below):
+    return above | row | below
+
+
+def erodeRow(row):
+    return row & (row << 1) & (row >> 1)
+
+
+def erodeRows(above, row, below):
+    return above & row & below
+
+
+# A bit-packed binary image: every row is a Python int where bit x is the pixel in column x (1 for foreground).
+# This takes one bit per pixel instead of a byte or a Python object, and lets 3x3 morphology work on whole rows at
+# once with shifts, AND and OR, instead of nine comparisons per pixel.
+class BinaryImage:
+    def __init__(self, image_width, image_height, rows=None):
+        self.width = image_width
+        self.height = image_height
+        self.mask = (1 << image_width) - 1
+        if rows is None:
+            rows = [0] * image_height
+        self.rows = rows
+
+    # pixels >= 1 are foreground, like in computeErosion8Nbh3x3FlatSE and computeDilation8Nbh3x3FlatSE
+    @classmethod
+    def fromPixelArray(cls, pixel_array, image_width, image_height):
+        return cls.fromThreshold(pixel_array, 1, image_width, image_height)
+
+    # pixels >= threshold_value are foreground, like in computeThresholdGE
+    @classmethod
+    def fromThreshold(cls, pixel_array, threshold_value, image_width, image_height):
+        rows = [packRow(pixel_array[height], threshold_value) for height in range(image_height)]
+        return cls(image_width, image_height, rows)
+
+    # returns a PixelArray with 1 for foreground and 0 for background pixels
+    def toPixelArray(self):
+        pixel_array = PixelArray(self.width, self.height, 'B')
+        if self.width == 0:
+            return pixel_array
+        for height in range(self.height):
+            bits = format(self.rows[height], '0{}b'.format(self.width))[::-1]
+            pixel_array[height][:] = array('B', bits.encode('ascii').translate(UNPACK_TABLE))
+        return pixel_array
+
+    def __eq__(self, other):
+        return isinstance(other, BinaryImage) and self.width == other.width and self.height == other.height and \
+            self.rows == other.rows
+
+    def countForeground(self):
+        return sum(bin(row).count('1') for row in self.rows)
+
+    # Dilation with the 3x3 flat structuring element (8 neighbourhood), pixels outside the image are background.
+    # A row is first dilated horizontally by OR-ing it with itself shifted one column either way, then every output
+    # row ORs the horizontally dilated rows above, at and below it.
+    def dilate3x3(self):
+        horizontal = [0] + [dilateRow(row, self.mask) for row in self.rows] + [0]
+        rows = [dilateRows(*window) for window in zip(horizontal, horizontal[1:], horizontal[2:])]
+        return BinaryImage(self.width, self.height, rows)
+
+    # Erosion with the 3x3 flat structuring element (8 neighbourhood), pixels outside the image are background, so
+    # the border rows and columns always erode away. Same structure as dilate3x3 with AND instead of OR.
+    def erode3x3(self):
+        horizontal = [0] + [erodeRow(row) for row in self.rows] + [0]
+        rows = [erodeRows(*window) for window in zip(horizontal, horizontal[1:], horizontal[2:])]
+        return BinaryImage(self.width, self.height, rows)
@@ -0,0 +1,134 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+
+# Per-stage instrumentation of the detection pipeline. Pass a StageProfiler to detect_qr (or wrap any stage
+# function with measure) and it records, for every stage, the number of calls, wall time, CPU time, the peak memory
+# allocated while the stage ran and the pixel throughput. report() formats these as a table and as_dict() gives the
+# same values for JSON output, e.g. in the records of BatchScanner --profile.
+#
+# Peak memory is measured with tracemalloc, which slows down allocation heavy Python code noticeably; create the
+# profiler with trace_memory=False to record times only (peak memory is then None). CPU time is the CPU time of the
+# whole process, so it includes other threads.
+#
+#   python Instrumentation.py images/covid19QRCode/poster1small.png [--json profile.json]
+
+
+class StageRecord:
+    def __init__(self, name, trace_memory = True):
+        self.name = name
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        # None when memory is not traced
+        self.peak_memory = 0 if trace_memory else None
+        self.pixels = 0
+
+    # pixels processed per second of wall time
+    def throughput(self):
+        if self.wall_time <= 0.0:
+            return 0.0
+        return self.pixels / self.wall_time
+
+    def as_dict(self):
+        return {"calls": self.calls,
+                "wall_time": self.wall_time,
+                "cpu_time": self.cpu_time,
+                "peak_memory": self.peak_memory,
+                "pixels": self.pixels,
+                "pixels_per_second": self.throughput()}
+
+
+class StageProfiler:
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        # stage name -> StageRecord, in the order the stages first ran
+        self.stages = {}
+
+    # runs function(*arguments, **keywords) as (part of) the stage called name, which processes `pixels` pixels,
+    # and returns its result
+    def measure(self, name, pixels, function, *arguments, **keywords):
+        record = self.stages.get(name)
+        if record is None:
+            record = self.stages[name] = StageRecord(name, self.trace_memory)
+
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            result = function(*arguments, **keywords)
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.process_time() - cpu_start
+            if self.trace_memory:
+                record.peak_memory = max(record.peak_memory, tracemalloc.get_traced_memory()[1] - memory_before)
+                if started_tracing:
+                    tracemalloc.stop()
+
+        record.calls += 1
+        record.wall_time += wall_time
+        record.cpu_time += cpu_time
+        record.pixels += pixels
+        return result
+
+    # counts pixels for a stage whose size was not known when it started, e.g. decoding
+    def addPixels(self, name, pixels):
+        self.stages[name].pixels += pixels
+
+    def totalWallTime(self):
+        return sum(record.wall_time for record in self.stages.values())
+
+    def as_dict(self):
+        return {name: record.as_dict() for (name, record) in self.stages.items()}
+
+    def report(self):
+        lines = ["{:<20} {:>5} {:>10} {:>10} {:>10} {:>10}".format(
+            "stage", "calls", "wall ms", "cpu ms", "peak MiB", "Mpx/s")]
+        for record in self.stages.values():
+            lines.append("{:<20} {:>5} {:>10.1f} {:>10.1f} {:>10} {:>10.2f}".format(
+                record.name, record.calls, record.wall_time * 1000, record.cpu_time * 1000,
+                "{:.2f}".format(record.peak_memory / 2 ** 20) if record.peak_memory is not None else "-",
+                record.throughput() / 1e6))
+        lines.append("{:<20} {:>5} {:>10.1f} {:>10.1f}".format(
+            "total", sum(record.calls for record in self.stages.values()), self.totalWallTime() * 1000,
+            sum(record.cpu_time for record in self.stages.values()) * 1000))
+        return "\n".join(lines)
+
+    def writeJSON(self, output_filename):
+        with open(output_filename, "w") as output_file:
+            json.dump(self.as_dict(), output_file, indent=2)
+
+
+def main():
+    import QRCodeDetection
+
+    parser = argparse.ArgumentParser(description="Per-stage profile of the QR code detection of one image.")
+    parser.add_argument("filename")
+    parser.add_argument("--json", help="also write the profile to this JSON file")
+    parser.add_argument("--backend", choices=["python", "numpy"], default="python")
+    parser.add_argument("--no-memory", action="store_true", help="do not trace memory (faster, no peak memory)")
+    arguments = parser.parse_args()
+
+    QRCodeDetection.setBackend(arguments.backend)
+    profiler = StageProfiler(trace_memory=not arguments.no_memory)
+    result = QRCodeDetection.detect_qr(arguments.filename, profiler=profiler)
+
+    print(result)
+    print(profiler.report())
+    if arguments.json is not None:
+        profiler.writeJSON(arguments.json)
+        print("profile written to {}".format(arguments.json), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import itertools
+from array import array
+
+from PixelArray import PixelArray
+
+
+# A summed-area table: sums[y][x] holds the sum of all pixels above and to the left of (x, y), exclusive, so it
+# has one more row and column than the image. Built once in a single pass, it answers the sum or mean of any
+# rectangle with four lookups, independent of the rectangle's size.
+#
+# Sums are kept as floats; for 8 bit images they are exact, for floating point images such as edge magnitudes they
+# carry the usual rounding error of a running sum (relative error around 1e-16 per addition).
+class IntegralImage:
+    def __init__(self, pixel_array, image_width, image_height):
+        self.width = image_width
+        self.height = image_height
+        self.sums = PixelArray(image_width + 1, image_height + 1, 'd')
+
+        above = self.sums[0]
+        for height in range(image_height):
+            row_prefix = itertools.accumulate(pixel_array[height], initial=0)
+            row = self.sums[height + 1]
+            row[:] = array('d', [total + value for (total, value) in zip(row_prefix, above)])
+            above = row
+
+    # sum of the pixels in the rectangle from (min_x, min_y) to (max_x, max_y), both corners inclusive
+    def rectangleSum(self, min_x, min_y, max_x, max_y):
+        sums = self.sums
+        return sums[max_y + 1][max_x + 1] - sums[min_y][max_x + 1] - sums[max_y + 1][min_x] + sums[min_y][min_x]
+
+    def rectangleMean(self, min_x, min_y, max_x, max_y):
+        area = (max_x - min_x + 1) * (max_y - min_y + 1)
+        return self.rectangleSum(min_x, min_y, max_x, max_y) / area
+
+    # Box averaging with a kernel_size x kernel_size window (kernel_size odd), following the conventions of
+    # QRCodeDetection.computeBoxAveraging: pixels closer than kernel_size // 2 to the border are 0.000 and results
+    # are rounded to 3 decimals.
+    def boxFilter(self, kernel_size = 3):
+        radius = kernel_size // 2
+        area = kernel_size * kernel_size
+        edges = PixelArray(self.width, self.height, 'd')
+        if self.width <= 2 * radius or self.height <= 2 * radius:
+            return edges
+
+        for height in range(radius, self.height - radius):
+            top = self.sums[height - radius]
+            bottom = self.sums[height + radius + 1]
+            window_sums = [bottom_right - top_right - bottom_left + top_left
+                           for (top_left, top_right, bottom_left, bottom_right)
+                           in zip(top, top[kernel_size:], bottom, bottom[kernel_size:])]
+            edges[height][radius:self.width - radius] = array('d', [round(window / area, 3) for window in window_sums])
+
+        return edges
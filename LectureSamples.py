@@ -1,48 +1,35 @@
-from matplotlib import pyplot
-
 import imageIO.png
 
 # this function reads an RGB color png file and returns width, height, as well as pixel arrays for r,g,b
 def readRGBImageToSeparatePixelArrays(input_filename):
     image_reader = imageIO.png.Reader(filename=input_filename)
-    # png reader gives us width and height, as well as RGB data in image_rows (a list of rows of RGB triplets)
-    (image_width, image_height, rgb_image_rows, rgb_image_info) = image_reader.read()
+    # png reader gives us width and height, as well as one array of values per channel (R, G, B and maybe A)
+    (image_width, image_height, planes, image_info) = image_reader.read_planes()
 
     print("read image width={}, height={}".format(image_width, image_height))
 
+    if len(planes) < 3:
+        # greyscale image, possibly with alpha
+        planes = [planes[0]] * 3
+
     # our pixel arrays are lists of lists, where each inner list stores one row of greyscale pixels
     pixel_array_r = []
     pixel_array_g = []
     pixel_array_b = []
 
-    for row in rgb_image_rows:
-        pixel_row_r = []
-        pixel_row_g = []
-        pixel_row_b = []
-        r = 0
-        g = 0
-        b = 0
-        for elem in range(len(row)):
-            # RGB triplets are stored consecutively in image_rows
-            if elem % 3 == 0:
-                r = row[elem]
-            elif elem % 3 == 1:
-                g = row[elem]
-            else:
-                b = row[elem]
-                pixel_row_r.append(r)
-                pixel_row_g.append(g)
-                pixel_row_b.append(b)
-
-        pixel_array_r.append(pixel_row_r)
-        pixel_array_g.append(pixel_row_g)
-        pixel_array_b.append(pixel_row_b)
+    for offset in range(0, image_width * image_height, image_width):
+        pixel_array_r.append(planes[0][offset:offset + image_width].tolist())
+        pixel_array_g.append(planes[1][offset:offset + image_width].tolist())
+        pixel_array_b.append(planes[2][offset:offset + image_width].tolist())
 
     return (image_width, image_height, pixel_array_r, pixel_array_g, pixel_array_b)
 
 
 
 def main():
+    # matplotlib is only needed for plotting, importing this module does not load it
+    from matplotlib import pyplot
+
     filename = "./images/contrast/krakow.png"
 
     (image_width, image_height, px_array_r, px_array_g, px_array_b) = readRGBImageToSeparatePixelArrays(filename)
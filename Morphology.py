@@ -0,0 +1,137 @@
+import itertools
+import math
+from array import array
+
+from PixelArray import PixelArray
+
+
+# Morphology with structuring elements of any size. Works on binary (0/1 or 0/255) as well as greyscale pixel
+# arrays: dilation takes the maximum and erosion the minimum over the structuring element. As in
+# computeErosion8Nbh3x3FlatSE and computeDilation8Nbh3x3FlatSE, pixels outside the image count as 0, so erosion
+# removes everything closer to the border than the structuring element reaches.
+#
+# Rectangles are separable, and both directions use the van Herk/Gil-Werman algorithm, which needs about three
+# comparisons per pixel whatever the window size. So erode(..., rectangle(2 * n + 1, 2 * n + 1)) costs the same for
+# every n and gives the same result as n iterations of the 3x3 operation. Other shapes are split into horizontal
+# segments, each filtered with van Herk/Gil-Werman; their cost grows with the number of rows of the shape.
+
+
+# A symmetric structuring element centred on the origin, described by its horizontal segments: a list of
+# (dy, left, right) meaning offsets (left..right, dy), inclusive. rectangle holds (width, height) for rectangles.
+class StructuringElement:
+    def __init__(self, segments, rectangle=None):
+        self.segments = segments
+        self.rectangle = rectangle
+
+
+def checkOddSize(size):
+    if size < 1 or size % 2 == 0:
+        raise ValueError("structuring element sizes must be positive and odd, got {}".format(size))
+
+
+def rectangle(width, height):
+    checkOddSize(width)
+    checkOddSize(height)
+    segments = [(dy, -(width // 2), width // 2) for dy in range(-(height // 2), height // 2 + 1)]
+    return StructuringElement(segments, (width, height))
+
+
+# a plus sign whose horizontal and vertical bars are size pixels long
+def cross(size):
+    checkOddSize(size)
+    radius = size // 2
+    segments = [(dy, 0, 0) if dy != 0 else (0, -radius, radius) for dy in range(-radius, radius + 1)]
+    return StructuringElement(segments)
+
+
+# all offsets (dx, dy) with dx * dx + dy * dy <= radius * radius
+def disk(radius):
+    segments = []
+    for dy in range(-radius, radius + 1):
+        half_width = math.isqrt(radius * radius - dy * dy)
+        segments.append((dy, -half_width, half_width))
+    return StructuringElement(segments)
+
+
+# van Herk/Gil-Werman running maximum or minimum (operation is max or min) of every window of window_size
+# consecutive values. The padded sequence is cut into blocks of window_size; every window spans at most two
+# blocks, so its result combines a suffix result of the first block with a prefix result of the second.
+def vanHerkGilWerman(values, window_size, operation, pad_value):
+    count = len(values) - window_size + 1
+    if count <= 0:
+        return []
+    if window_size == 1:
+        return list(values)
+
+    values = list(values) + [pad_value] * (-len(values) % window_size)
+    blocks = range(0, len(values), window_size)
+    prefix = list(itertools.chain.from_iterable(
+        itertools.accumulate(values[start:start + window_size], operation) for start in blocks))
+    suffix = list(itertools.chain.from_iterable(
+        reversed(list(itertools.accumulate(reversed(values[start:start + window_size]), operation)))
+        for start in blocks))
+
+    return [operation(left, right) for (left, right) in zip(suffix[:count], prefix[window_size - 1:])]
+
+
+# operation over the window (x + left .. x + right) of every position x of a row, with pad_value outside the row;
+# left <= 0 <= right for all segments of the structuring elements above
+def filterRow(row, left, right, operation, pad_value):
+    padded = [pad_value] * -left + list(row) + [pad_value] * right
+    return vanHerkGilWerman(padded, right - left + 1, operation, pad_value)
+
+
+def toPixelArray(rows, pixel_array, image_width, image_height):
+    typecode = pixel_array.typecode if isinstance(pixel_array, PixelArray) else 'd'
+    result = PixelArray(image_width, image_height, typecode)
+    for height in range(image_height):
+        result[height][:] = array(typecode, rows[height])
+    return result
+
+
+def applyStructuringElement(pixel_array, image_width, image_height, structuring_element, operation):
+    pad_value = 0
+
+    if structuring_element.rectangle is not None:
+        (width, height) = structuring_element.rectangle
+        rows = [filterRow(pixel_array[y], -(width // 2), width // 2, operation, pad_value)
+                for y in range(image_height)]
+        columns = [filterRow(column, -(height // 2), height // 2, operation, pad_value) for column in zip(*rows)]
+        return toPixelArray([list(row) for row in zip(*columns)], pixel_array, image_width, image_height)
+
+    # filter every row once per distinct segment width, then combine the segments row by row
+    filtered = {}
+    for (dy, left, right) in structuring_element.segments:
+        if (left, right) not in filtered:
+            filtered[(left, right)] = [filterRow(pixel_array[y], left, right, operation, pad_value)
+                                       for y in range(image_height)]
+
+    outside = [pad_value] * image_width
+    rows = []
+    for y in range(image_height):
+        result = None
+        for (dy, left, right) in structuring_element.segments:
+            source = filtered[(left, right)][y + dy] if 0 <= y + dy < image_height else outside
+            result = source if result is None else [operation(a, b) for (a, b) in zip(result, source)]
+        rows.append(result)
+    return toPixelArray(rows, pixel_array, image_width, image_height)
+
+
+def dilate(pixel_array, image_width, image_height, structuring_element):
+    return applyStructuringElement(pixel_array, image_width, image_height, structuring_element, max)
+
+
+def erode(pixel_array, image_width, image_height, structuring_element):
+    return applyStructuringElement(pixel_array, image_width, image_height, structuring_element, min)
+
+
+# erosion followed by dilation: removes foreground details smaller than the structuring element
+def opening(pixel_array, image_width, image_height, structuring_element):
+    eroded = erode(pixel_array, image_width, image_height, structuring_element)
+    return dilate(eroded, image_width, image_height, structuring_element)
+
+
+# dilation followed by erosion: fills gaps and holes smaller than the structuring element
+def closing(pixel_array, image_width, image_height, structuring_element):
+    dilated = dilate(pixel_array, image_width, image_height, structuring_element)
+    return erode(dilated, image_width, image_height, structuring_element)
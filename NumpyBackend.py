@@ -0,0 +1,347 @@
+import numpy
+
+import imageIO.png
+from PixelArray import PixelArray
+
+
+# Whole-array implementations of the QRCodeDetection pipeline functions. Every function has the same name,
+# arguments and results as its pure Python counterpart in QRCodeDetection.py (pixel arrays are numpy arrays
+# instead of PixelArrays), and produces identical values, including the 0.0 image border and round(..., 3).
+# Select this backend with QRCodeDetection.setBackend("numpy").
+
+
+# converts a PixelArray or a list of lists into a 2D numpy array without copying where possible
+def asNumpyArray(pixel_array, image_width, image_height, dtype=None):
+    if isinstance(pixel_array, PixelArray):
+        pixel_array = numpy.frombuffer(pixel_array.data, dtype=pixel_array.typecode)
+        pixel_array = pixel_array.reshape(image_height, pixel_array.size // image_height)[:, :image_width]
+    return numpy.asarray(pixel_array, dtype=dtype)
+
+
+# round(value, 3) for every element, matching Python's correctly rounded round() exactly. numpy.round scales
+# by 1000 first, which can land on the other side of a tie, so values close to a tie are redone in Python.
+def round3(values):
+    rounded = numpy.round(values, 3)
+    scaled = values * 1000
+    ties = numpy.abs(scaled - numpy.floor(scaled) - 0.5) < 1e-6
+    if ties.any():
+        rounded[ties] = [round(value, 3) for value in values[ties].tolist()]
+    return rounded
+
+
+def createInitializedGreyscalePixelArray(image_width, image_height, initValue = 0, typecode = 'd'):
+    return numpy.full((image_height, image_width), initValue, dtype=typecode)
+
+
+def readRGBImageToSeparatePixelArrays(input_filename):
+    image_reader = imageIO.png.Reader(filename=input_filename)
+    (image_width, image_height, planes, image_info) = image_reader.read_planes()
+
+    print("read image width={}, height={}".format(image_width, image_height))
+
+    if len(planes) < 3:
+        planes = [planes[0]] * 3
+    # planes are 'B' arrays, or 'H' arrays for 16 bit images
+    (r, g, b) = [numpy.frombuffer(plane, dtype=plane.typecode).reshape(image_height, image_width)
+                 for plane in planes[:3]]
+
+    return (image_width, image_height, r, g, b)
+
+
+def readGreyscaleImageToPixelArray(input_filename):
+    image_reader = imageIO.png.Reader(filename=input_filename)
+    (image_width, image_height, pixels, image_info) = image_reader.read_greyscale()
+
+    print("read image width={}, height={}".format(image_width, image_height))
+
+    return (image_width, image_height, numpy.frombuffer(pixels, dtype=numpy.uint8).reshape(image_height, image_width))
+
+
+def prepareRGBImageForImshowFromIndividualArrays(r,g,b,w,h):
+    return numpy.dstack((asNumpyArray(r, w, h), asNumpyArray(g, w, h), asNumpyArray(b, w, h)))
+
+
+def computeRGBToGreyscale(pixel_array_r, pixel_array_g, pixel_array_b, image_width, image_height):
+    r = asNumpyArray(pixel_array_r, image_width, image_height)
+    g = asNumpyArray(pixel_array_g, image_width, image_height)
+    b = asNumpyArray(pixel_array_b, image_width, image_height)
+
+    # numpy.rint rounds half to even, like round(); as in the Python backend, 16 bit channels give a 16 bit image
+    g_val = 0.299 * r + 0.587 * g + 0.114 * b
+    dtype = numpy.uint16 if numpy.uint16 in (r.dtype, g.dtype, b.dtype) else numpy.uint8
+    return numpy.rint(g_val).astype(dtype)
+
+
+def computeHorizontalEdgesSobel(pixel_array, image_width, image_height):
+    pixel_array = asNumpyArray(pixel_array, image_width, image_height)
+    edges = numpy.zeros((image_height, image_width))
+    if image_width < 3 or image_height < 3:
+        return edges
+
+    above = pixel_array[:-2]
+    below = pixel_array[2:]
+    positive_part = above[:, :-2] / 8 + above[:, 1:-1] / 4 + above[:, 2:] / 8
+    negative_part = below[:, :-2] / 8 + below[:, 1:-1] / 4 + below[:, 2:] / 8
+    edges[1:-1, 1:-1] = round3(positive_part - negative_part)
+
+    return edges
+
+
+def computeVerticalEdgesSobel(pixel_array, image_width, image_height):
+    pixel_array = asNumpyArray(pixel_array, image_width, image_height)
+    edges = numpy.zeros((image_height, image_width))
+    if image_width < 3 or image_height < 3:
+        return edges
+
+    left = pixel_array[:, :-2]
+    right = pixel_array[:, 2:]
+    negative_part = left[:-2] / 8 + left[1:-1] / 4 + left[2:] / 8
+    positive_part = right[:-2] / 8 + right[1:-1] / 4 + right[2:] / 8
+    edges[1:-1, 1:-1] = round3(positive_part - negative_part)
+
+    return edges
+
+
+def get_edge_magnitude(horizontal_sobel_array, vertical_sobel_array, image_width, image_height):
+    horizontal = asNumpyArray(horizontal_sobel_array, image_width, image_height, numpy.float64)
+    vertical = asNumpyArray(vertical_sobel_array, image_width, image_height, numpy.float64)
+
+    return numpy.sqrt(horizontal * horizontal + vertical * vertical)
+
+
+def computeSobelGradients(pixel_array, image_width, image_height,
+                          compute_horizontal = True, compute_vertical = True, compute_magnitude = True):
+    horizontal_edges = computeHorizontalEdgesSobel(pixel_array, image_width, image_height)
+    vertical_edges = computeVerticalEdgesSobel(pixel_array, image_width, image_height)
+    edge_magnitude = None
+    if compute_magnitude:
+        edge_magnitude = get_edge_magnitude(horizontal_edges, vertical_edges, image_width, image_height)
+
+    return (horizontal_edges if compute_horizontal else None, vertical_edges if compute_vertical else None,
+            edge_magnitude)
+
+
+def computeBoxAveraging3x3(pixel_array, image_width, image_height):
+    pixel_array = asNumpyArray(pixel_array, image_width, image_height, numpy.float64)
+    edges = numpy.zeros((image_height, image_width))
+    if image_width < 3 or image_height < 3:
+        return edges
+
+    # the nine neighbours are added in the same order as the Python version so the sums round identically
+    sum = numpy.zeros((image_height - 2, image_width - 2))
+    for dy in range(3):
+        for dx in range(3):
+            sum += pixel_array[dy:image_height - 2 + dy, dx:image_width - 2 + dx]
+    edges[1:-1, 1:-1] = round3(sum / 9)
+
+    return edges
+
+
+def computeBoxAveraging(pixel_array, image_width, image_height, kernel_size = 3):
+    pixel_array = asNumpyArray(pixel_array, image_width, image_height, numpy.float64)
+    radius = kernel_size // 2
+    edges = numpy.zeros((image_height, image_width))
+    if image_width <= 2 * radius or image_height <= 2 * radius:
+        return edges
+
+    prefix = numpy.zeros((image_height + 1, image_width + 1))
+    prefix[1:, 1:] = pixel_array.cumsum(axis=0).cumsum(axis=1)
+    window_sums = prefix[kernel_size:, kernel_size:] - prefix[:-kernel_size, kernel_size:] \
+        - prefix[kernel_size:, :-kernel_size] + prefix[:-kernel_size, :-kernel_size]
+    edges[radius:image_height - radius, radius:image_width - radius] = round3(window_sums / (kernel_size * kernel_size))
+
+    return edges
+
+
+# applies the 1D operator of QRCodeDetection.repeatedBoxAveragingWeights along the first axis of values
+def applyRepeatedBoxAveragingWeights(values, kernel, border):
+    length = values.shape[0]
+    repeat = len(kernel) // 2
+    smoothed = numpy.zeros(values.shape)
+    count = length - 2 * repeat
+    if count > 0:
+        for k in range(len(kernel)):
+            smoothed[repeat:length - repeat] += kernel[k] * values[k:k + count]
+    for (position, weights) in border.items():
+        for (index, weight) in weights:
+            smoothed[position] += weight * values[index]
+    return smoothed
+
+
+def computeRepeatedBoxAveraging3x3(pixel_array, image_width, image_height, repeat):
+    from QRCodeDetection import repeatedBoxAveragingWeights
+
+    pixel_array = asNumpyArray(pixel_array, image_width, image_height, numpy.float64)
+    horizontal = applyRepeatedBoxAveragingWeights(pixel_array.T, *repeatedBoxAveragingWeights(image_width, repeat)).T
+    smoothed = applyRepeatedBoxAveragingWeights(horizontal, *repeatedBoxAveragingWeights(image_height, repeat))
+
+    return round3(smoothed)
+
+
+def contrast_stretch(pixel_array, image_width, image_height):
+    g_max = 255
+    g_low = 0
+
+    pixel_array = asNumpyArray(pixel_array, image_width, image_height, numpy.float64)
+
+    f_high = float(pixel_array.max())
+    f_low = float(pixel_array.min())
+
+    a = (g_max - g_low) / (f_high - f_low)
+    b = g_low - f_low * ((g_max - g_low) / (f_high - f_low))
+
+    contrast_stretched_array = a * pixel_array + b
+    contrast_stretched_array[pixel_array < g_low] = 0
+    contrast_stretched_array[pixel_array > g_max] = 255
+
+    return contrast_stretched_array
+
+
+def computeThresholdGE(pixel_array, threshold_value, image_width, image_height):
+    pixel_array = asNumpyArray(pixel_array, image_width, image_height)
+
+    return numpy.where(pixel_array < threshold_value, 0, 255).astype(numpy.uint8)
+
+
+def padBinary(pixel_array, image_width, image_height):
+    padded_array = numpy.zeros((image_height + 2, image_width + 2), dtype=bool)
+    padded_array[1:-1, 1:-1] = asNumpyArray(pixel_array, image_width, image_height) >= 1
+    return padded_array
+
+
+def computeErosion8Nbh3x3FlatSE(pixel_array, image_width, image_height):
+    padded_array = padBinary(pixel_array, image_width, image_height)
+
+    edges = numpy.ones((image_height, image_width), dtype=bool)
+    for dy in range(3):
+        for dx in range(3):
+            edges &= padded_array[dy:image_height + dy, dx:image_width + dx]
+
+    return edges.astype(numpy.uint8)
+
+
+def computeDilation8Nbh3x3FlatSE(pixel_array, image_width, image_height):
+    padded_array = padBinary(pixel_array, image_width, image_height)
+
+    edges = numpy.zeros((image_height, image_width), dtype=bool)
+    for dy in range(3):
+        for dx in range(3):
+            edges |= padded_array[dy:image_height + dy, dx:image_width + dx]
+
+    return edges.astype(numpy.uint8)
+
+
+# Labels 4-connected components via horizontal runs of foreground pixels: runs are found with whole-array
+# operations, and only the (far fewer) runs are merged in Python. Labels are numbered in the order in which the
+# Python version's raster scan first reaches each component.
+def computeConnectedComponentLabeling(pixel_array, image_width, image_height, compute_statistics = False):
+    foreground = asNumpyArray(pixel_array, image_width, image_height) >= 1
+
+    padded_rows = numpy.zeros((image_height, image_width + 2), dtype=numpy.int8)
+    padded_rows[:, 1:-1] = foreground
+    changes = numpy.diff(padded_rows, axis=1)
+    (run_rows, run_starts) = numpy.nonzero(changes == 1)
+    run_ends = numpy.nonzero(changes == -1)[1]
+
+    run_count = len(run_starts)
+    parent = list(range(run_count))
+
+    def find(run):
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    # runs are sorted by row, so runs of consecutive rows can be matched with a merge-style sweep
+    row_first_run = numpy.searchsorted(run_rows, numpy.arange(image_height + 1)).tolist()
+    starts = run_starts.tolist()
+    ends = run_ends.tolist()
+    # number of pixels of each run that touch a run in the row above, for the perimeter
+    shared = [0] * run_count
+    for height in range(1, image_height):
+        i = row_first_run[height - 1]
+        i_end = row_first_run[height]
+        j = i_end
+        j_end = row_first_run[height + 1]
+        while i < i_end and j < j_end:
+            if starts[i] < ends[j] and starts[j] < ends[i]:
+                shared[j] += min(ends[i], ends[j]) - max(starts[i], starts[j])
+                root_i = find(i)
+                root_j = find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+            if ends[i] < ends[j]:
+                i += 1
+            else:
+                j += 1
+
+    a_dict = {}
+    root_labels = {}
+    run_labels = []
+    for run in range(run_count):
+        root = find(run)
+        if root not in root_labels:
+            root_labels[root] = len(root_labels) + 1
+            a_dict[root_labels[root]] = 0
+        label = root_labels[root]
+        run_labels.append(label)
+        a_dict[label] += ends[run] - starts[run]
+
+    image_array = numpy.zeros((image_height, image_width), dtype=numpy.uint32)
+    for run in range(run_count):
+        image_array[run_rows[run], starts[run]:ends[run]] = run_labels[run]
+
+    if not compute_statistics:
+        return (image_array, a_dict)
+
+    # per label: [sum_x, sum_y, min_x, min_y, max_x, max_y, perimeter]
+    statistics = {}
+    rows = run_rows.tolist()
+    for run in range(run_count):
+        label = run_labels[run]
+        (start, end, height) = (starts[run], ends[run], rows[run])
+        length = end - start
+        if label not in statistics:
+            statistics[label] = [0, 0, start, height, end - 1, height, 0]
+        label_statistics = statistics[label]
+        label_statistics[0] += (start + end - 1) * length // 2
+        label_statistics[1] += height * length
+        label_statistics[2] = min(label_statistics[2], start)
+        label_statistics[4] = max(label_statistics[4], end - 1)
+        label_statistics[5] = height
+        label_statistics[6] += 2 * length + 2 - 2 * shared[run]
+
+    component_statistics = {}
+    for label in a_dict:
+        (sum_x, sum_y, min_x, min_y, max_x, max_y, perimeter) = statistics[label]
+        component_statistics[label] = {'size': a_dict[label],
+                                       'bounding_box': (min_x, min_y, max_x, max_y),
+                                       'centroid': (sum_x / a_dict[label], sum_y / a_dict[label]),
+                                       'perimeter': perimeter}
+
+    return (image_array, a_dict, component_statistics)
+
+
+def find_largest_component(pixel_array, component_sizes, image_width, image_height):
+    largest_label = 0
+    largest_number = 0
+
+    for key in component_sizes.keys():
+        if component_sizes[key] > largest_number:
+            largest_number = component_sizes[key]
+            largest_label = key
+
+    pixel_array[pixel_array != largest_label] = 0
+
+    return pixel_array
+
+
+def bounding_box(pixel_array, image_width, image_height):
+    pixel_array = asNumpyArray(pixel_array, image_width, image_height)
+
+    rows = numpy.nonzero(pixel_array.any(axis=1))[0]
+    columns = numpy.nonzero(pixel_array.any(axis=0))[0]
+    if len(rows) == 0:
+        return (None, None, 0, 0)
+
+    return (int(columns[0]), int(rows[0]), int(columns[-1]), int(rows[-1]))
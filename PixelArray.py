@@ -0,0 +1,73 @@
+from array import array
+
+
+# A compact pixel array backed by a single contiguous array.array buffer.
+# Rows are exposed as memoryview slices of that buffer, so existing code that indexes pixel_array[y][x],
+# iterates over rows, or calls min()/max() on a row keeps working without a list object per row or an
+# int/float object per pixel.
+#
+# typecode follows the array module: 'B' for 8 bit greyscale and binary images, 'd' for floating point
+# intermediates such as edge magnitudes, 'I' for component labels.
+class PixelArray:
+    def __init__(self, image_width, image_height, typecode='d', initValue=0, data=None):
+        self.width = image_width
+        self.height = image_height
+        self.typecode = typecode
+        # number of elements between the start of two consecutive rows
+        self.stride = image_width
+
+        if data is None:
+            data = array(typecode, [initValue]) * (self.stride * image_height)
+        elif len(data) != self.stride * image_height:
+            raise ValueError("expected {} values, got {}".format(self.stride * image_height, len(data)))
+        else:
+            # rows are views of the buffer as it is, so its element type has to be the one rows are read as
+            data_typecode = data.typecode if isinstance(data, array) else 'B' if isinstance(data, (bytes, bytearray)) \
+                else None
+            if data_typecode is not None and data_typecode != typecode:
+                raise ValueError("data of typecode {!r} given for a PixelArray of typecode {!r}".format(
+                    data_typecode, typecode))
+        self.data = data
+
+        view = memoryview(self.data)
+        self.rows = [view[y * self.stride:y * self.stride + image_width] for y in range(image_height)]
+
+    @classmethod
+    def fromRows(cls, rows, image_width, image_height, typecode='d'):
+        pixel_array = cls(image_width, image_height, typecode)
+        for height in range(image_height):
+            pixel_row = pixel_array.rows[height]
+            row = rows[height]
+            for width in range(image_width):
+                pixel_row[width] = row[width]
+        return pixel_array
+
+    def __getitem__(self, y):
+        return self.rows[y]
+
+    def __len__(self):
+        return self.height
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __eq__(self, other):
+        if isinstance(other, PixelArray):
+            return self.width == other.width and self.height == other.height and self.tolist() == other.tolist()
+        return self.tolist() == other
+
+    def __reduce__(self):
+        # memoryviews cannot be pickled, so rebuild them from the flat buffer on the other side
+        return (self.__class__, (self.width, self.height, self.typecode, 0, self.data))
+
+    def copy(self):
+        return self.__class__(self.width, self.height, self.typecode, data=array(self.typecode, self.data))
+
+    def tolist(self):
+        return [row.tolist() for row in self.rows]
+
+
+def asPixelArray(pixel_array, image_width, image_height, typecode='d'):
+    if isinstance(pixel_array, PixelArray):
+        return pixel_array
+    return PixelArray.fromRows(pixel_array, image_width, image_height, typecode)
@@ -1,126 +1,170 @@
 
-from matplotlib import pyplot
-from matplotlib.patches import Rectangle
+import itertools
 import math
-import imageIO.png
+import os
+import time
+from array import array
+from BinaryImage import BinaryImage
+from IntegralImage import IntegralImage
+from PixelArray import PixelArray
 
+# imageIO.png and matplotlib are imported by the functions that use them, so importing this module for its image
+# processing functions (e.g. in short-lived worker processes) stays fast
 
-def createInitializedGreyscalePixelArray(image_width, image_height, initValue = 0):
 
-    new_array = [[initValue for x in range(image_width)] for y in range(image_height)]
+# pixel arrays are PixelArray objects: one contiguous buffer of the given typecode, indexed as pixel_array[y][x]
+def createInitializedGreyscalePixelArray(image_width, image_height, initValue = 0, typecode = 'd'):
+
+    new_array = PixelArray(image_width, image_height, typecode, initValue)
     return new_array
 
 
 # this function reads an RGB color png file and returns width, height, as well as pixel arrays for r,g,b
 def readRGBImageToSeparatePixelArrays(input_filename):
 
+    import imageIO.png
     image_reader = imageIO.png.Reader(filename=input_filename)
-    # png reader gives us width and height, as well as RGB data in image_rows (a list of rows of RGB triplets)
-    (image_width, image_height, rgb_image_rows, rgb_image_info) = image_reader.read()
+    # png reader gives us width and height, as well as one array of values per channel (R, G, B and maybe A)
+    (image_width, image_height, planes, image_info) = image_reader.read_planes()
 
     print("read image width={}, height={}".format(image_width, image_height))
 
-    # our pixel arrays are lists of lists, where each inner list stores one row of greyscale pixels
-    pixel_array_r = []
-    pixel_array_g = []
-    pixel_array_b = []
-
-    for row in rgb_image_rows:
-        pixel_row_r = []
-        pixel_row_g = []
-        pixel_row_b = []
-        r = 0
-        g = 0
-        b = 0
-        for elem in range(len(row)):
-            # RGB triplets are stored consecutively in image_rows
-            if elem % 3 == 0:
-                r = row[elem]
-            elif elem % 3 == 1:
-                g = row[elem]
-            else:
-                b = row[elem]
-                pixel_row_r.append(r)
-                pixel_row_g.append(g)
-                pixel_row_b.append(b)
+    if len(planes) < 3:
+        # greyscale image, possibly with alpha
+        planes = [planes[0]] * 3
 
-        pixel_array_r.append(pixel_row_r)
-        pixel_array_g.append(pixel_row_g)
-        pixel_array_b.append(pixel_row_b)
+    # our pixel arrays are PixelArrays of the planes' own type ('B', or 'H' for 16 bit images), where each row is a
+    # view onto the decoded plane
+    pixel_array_r = PixelArray(image_width, image_height, planes[0].typecode, data=planes[0])
+    pixel_array_g = PixelArray(image_width, image_height, planes[1].typecode, data=planes[1])
+    pixel_array_b = PixelArray(image_width, image_height, planes[2].typecode, data=planes[2])
 
     return (image_width, image_height, pixel_array_r, pixel_array_g, pixel_array_b)
 
 
+# this function reads a png file straight into an 8-bit greyscale pixel array; the colour channels are never stored.
+# For 8-bit images without a palette these are the same values as computeRGBToGreyscale computes from the r,g,b pixel
+# arrays. Palette images and other bit depths are first converted to 8-bit RGB (16-bit samples are rescaled to 8
+# bits), so their values can differ from computeRGBToGreyscale on the planes that readRGBImageToSeparatePixelArrays
+# returns for them.
+def readGreyscaleImageToPixelArray(input_filename):
+
+    import imageIO.png
+    image_reader = imageIO.png.Reader(filename=input_filename)
+    (image_width, image_height, pixels, image_info) = image_reader.read_greyscale()
+
+    print("read image width={}, height={}".format(image_width, image_height))
+
+    return (image_width, image_height, PixelArray(image_width, image_height, 'B', data=pixels))
+
+
 # This method packs together three individual pixel arrays for r, g and b values into a single array that is fit for
-# use in matplotlib's imshow method
+# use in matplotlib's imshow method: one bytearray of h x w x 3 bytes, interleaved with strided slice assignments,
+# and returned as a memoryview of shape (h, w, 3) that numpy (and so imshow) reads without copying
 def prepareRGBImageForImshowFromIndividualArrays(r,g,b,w,h):
-    rgbImage = []
-    for y in range(h):
-        row = []
-        for x in range(w):
-            triple = []
-            triple.append(r[y][x])
-            triple.append(g[y][x])
-            triple.append(b[y][x])
-            row.append(triple)
-        rgbImage.append(row)
-    return rgbImage
-    
+    rgbImage = bytearray(w * h * 3)
+    for (channel, pixel_array) in enumerate((r, g, b)):
+        if isinstance(pixel_array, PixelArray) and pixel_array.typecode == 'B':
+            rgbImage[channel::3] = pixel_array.data
+        elif isinstance(pixel_array, PixelArray) and pixel_array.typecode == 'H':
+            # 16 bit channels are shown with their high byte
+            rgbImage[channel::3] = bytes(value >> 8 for value in pixel_array.data)
+        else:
+            for y in range(h):
+                rgbImage[(y * w) * 3 + channel:(y * w + w) * 3:3] = array('B', pixel_array[y])
+    return memoryview(rgbImage).cast('B', (h, w, 3))
+
+
+# this function reads a png file straight into an h x w x 3 (or h x w x 4 with transparency) array for imshow: the
+# decoded rows are already interleaved, so they are joined into one buffer without splitting them into planes
+def readRGBImageForImshow(input_filename):
+
+    import imageIO.png
+    image_reader = imageIO.png.Reader(filename=input_filename)
+    image_reader.preamble()
+    if image_reader.alpha or image_reader.trns is not None:
+        (image_width, image_height, rows, image_info) = image_reader.asRGBA8()
+    else:
+        (image_width, image_height, rows, image_info) = image_reader.asRGB8()
+
+    # rows are byte arrays, except for images rescaled from other bit depths
+    rgbImage = bytearray().join(bytes(row) if isinstance(row, list) else row for row in rows)
+    return (image_width, image_height, memoryview(rgbImage).cast('B', (image_height, image_width,
+                                                                       image_info['planes'])))
+
 
 # This method takes a greyscale pixel array and writes it into a png file
-def writeGreyscalePixelArraytoPNG(output_filename, pixel_array, image_width, image_height):
+# filter_type is passed on to imageIO.png.Writer. The default 0 (no filtering) is the fastest and suits binary masks
+# and edge images best; 'fast' chooses between the None, Sub and Up png filters per row, which shrinks contrast
+# stretched images by about a third for about three times the write time; 'size' tries every filter and writes the
+# smallest file, but takes over ten times as long. threads > 1 compresses on that many threads: the segments of
+# large images, or with 'size' the compressions of the different filters
+def writeGreyscalePixelArraytoPNG(output_filename, pixel_array, image_width, image_height, filter_type = 0,
+                                  threads = None):
+    if isinstance(pixel_array, PixelArray) and pixel_array.typecode != 'B':
+        # the writer reads every row as raw bytes, so floating point and label arrays are rounded to 8 bit rows first;
+        # values outside 0 to 255 raise an OverflowError
+        pixel_array = [array('B', map(round, row)) for row in pixel_array]
+
     # now write the pixel array as a greyscale png
     file = open(output_filename, 'wb')  # binary mode is important
-    writer = imageIO.png.Writer(image_width, image_height, greyscale=True)
+    import imageIO.png
+    writer = imageIO.png.Writer(image_width, image_height, greyscale=True, filter_type=filter_type, threads=threads)
     writer.write(file, pixel_array)
     file.close()
 
 
+# the values of row `height` of a pixel array as a list: the per pixel loops iterate over lists, which is much faster
+# than indexing the memoryview rows of a PixelArray pixel by pixel
+def rowValues(pixel_array, height):
+    row = pixel_array[height]
+    if hasattr(row, "tolist"):
+        return row.tolist()
+    return list(row)
+
+
+# the greyscale image has the typecode of the channels: 'H' if any channel is a 16 bit PixelArray, else 'B'
 def computeRGBToGreyscale(pixel_array_r, pixel_array_g, pixel_array_b, image_width, image_height):
-    greyscale_pixel_array = createInitializedGreyscalePixelArray(image_width, image_height)
+    typecode = 'H' if 'H' in [getattr(pixel_array, "typecode", None)
+                              for pixel_array in (pixel_array_r, pixel_array_g, pixel_array_b)] else 'B'
+    greyscale_pixel_array = createInitializedGreyscalePixelArray(image_width, image_height, typecode=typecode)
 
     # STUDENT CODE HERE
 
     for height in range(image_height):
-        for width in range(image_width):
-            g_val = 0.299 * pixel_array_r[height][width] + 0.587 * pixel_array_g[height][width] + 0.114 * pixel_array_b[height][width]
-            greyscale_pixel_array[height][width] = round(g_val)
+        greyscale_pixel_array[height][:] = array(typecode, [
+            round(0.299 * r + 0.587 * g + 0.114 * b)
+            for (r, g, b) in zip(rowValues(pixel_array_r, height), rowValues(pixel_array_g, height),
+                                 rowValues(pixel_array_b, height))])
 
     return greyscale_pixel_array
 
 
 def computeHorizontalEdgesSobel(pixel_array, image_width, image_height):
-    edges = []
-    for height in range(image_height):
-        row = []
-        for width in range(image_width):
-            if height == 0 or width == 0 or height == image_height - 1 or width == image_width - 1:
-                row.append(0.000)
-            else:
-                positive_part = pixel_array[height - 1][width - 1] / 8 + pixel_array[height - 1][width] / 4 + \
-                                pixel_array[height - 1][width + 1] / 8
-                negative_part = pixel_array[height + 1][width - 1] / 8 + pixel_array[height + 1][width] / 4 + \
-                                pixel_array[height + 1][width + 1] / 8
-                row.append(round(positive_part - negative_part, 3))
-        edges.append(row)
+    # border pixels stay at 0.000
+    edges = createInitializedGreyscalePixelArray(image_width, image_height, 0.000)
+    for height in range(1, image_height - 1):
+        above = rowValues(pixel_array, height - 1)
+        below = rowValues(pixel_array, height + 1)
+        edges[height][1:image_width - 1] = array('d', [
+            round((top_left / 8 + top / 4 + top_right / 8) - (bottom_left / 8 + bottom / 4 + bottom_right / 8), 3)
+            for (top_left, top, top_right, bottom_left, bottom, bottom_right) in
+            zip(above, above[1:], above[2:], below, below[1:], below[2:])])
 
     return edges
 
 
 def computeVerticalEdgesSobel(pixel_array, image_width, image_height):
-    edges = []
-    for height in range(image_height):
-        row = []
-        for width in range(image_width):
-            if height == 0 or width == 0 or height == image_height - 1 or width == image_width - 1:
-                row.append(0.000)
-            else:
-                negative_part = pixel_array[height - 1][width - 1] / 8 + pixel_array[height][width - 1] / 4 + \
-                                pixel_array[height + 1][width - 1] / 8
-                positive_part = pixel_array[height - 1][width + 1] / 8 + pixel_array[height][width + 1] / 4 + \
-                                pixel_array[height + 1][width + 1] / 8
-                row.append(round(positive_part - negative_part, 3))
-        edges.append(row)
+    # border pixels stay at 0.000
+    edges = createInitializedGreyscalePixelArray(image_width, image_height, 0.000)
+    for height in range(1, image_height - 1):
+        above = rowValues(pixel_array, height - 1)
+        row = rowValues(pixel_array, height)
+        below = rowValues(pixel_array, height + 1)
+        edges[height][1:image_width - 1] = array('d', [
+            round((top_right / 8 + right / 4 + bottom_right / 8) - (top_left / 8 + left / 4 + bottom_left / 8), 3)
+            for (top_left, top_right, left, right, bottom_left, bottom_right) in
+            zip(above, above[2:], row, row[2:], below, below[2:])])
 
     return edges
 
@@ -129,37 +173,204 @@ def get_edge_magnitude(horizontal_sobel_array, vertical_sobel_array, image_width
     edge_magnitude = createInitializedGreyscalePixelArray(image_width, image_height)
 
     for height in range(image_height):
-        for width in range(image_width):
-            edge_magnitude[height][width] = math.sqrt(math.pow(horizontal_sobel_array[height][width], 2) + math.pow(vertical_sobel_array[height][width], 2))
+        edge_magnitude[height][:] = array('d', [
+            math.sqrt(math.pow(horizontal, 2) + math.pow(vertical, 2))
+            for (horizontal, vertical) in zip(rowValues(horizontal_sobel_array, height),
+                                              rowValues(vertical_sobel_array, height))])
 
     return edge_magnitude
 
 
+# Sobel gradients and edge magnitude of the middle row of three consecutive rows, for columns 1 to width - 2
+def computeSobelRow(above, row, below):
+    horizontal_row = []
+    vertical_row = []
+    magnitude_row = []
+    for (top_left, top, top_right, left, right, bottom_left, bottom, bottom_right) in \
+            zip(above, above[1:], above[2:], row, row[2:], below, below[1:], below[2:]):
+        horizontal = round((top_left / 8 + top / 4 + top_right / 8) -
+                           (bottom_left / 8 + bottom / 4 + bottom_right / 8), 3)
+        vertical = round((top_right / 8 + right / 4 + bottom_right / 8) -
+                         (top_left / 8 + left / 4 + bottom_left / 8), 3)
+        horizontal_row.append(horizontal)
+        vertical_row.append(vertical)
+        magnitude_row.append(math.sqrt(horizontal * horizontal + vertical * vertical))
+
+    return (horizontal_row, vertical_row, magnitude_row)
+
+
+# Horizontal and vertical Sobel edges and the edge magnitude in a single traversal of pixel_array: every 3x3
+# neighbourhood is loaded once and used for both gradients and the magnitude. Each output is only allocated when
+# requested and is None otherwise, so compute_horizontal=False, compute_vertical=False gives the edge magnitude
+# without ever creating the two gradient arrays. Results equal computeHorizontalEdgesSobel,
+# computeVerticalEdgesSobel and get_edge_magnitude.
+def computeSobelGradients(pixel_array, image_width, image_height,
+                          compute_horizontal = True, compute_vertical = True, compute_magnitude = True):
+    horizontal_edges = None
+    vertical_edges = None
+    edge_magnitude = None
+    if compute_horizontal:
+        horizontal_edges = createInitializedGreyscalePixelArray(image_width, image_height, 0.000)
+    if compute_vertical:
+        vertical_edges = createInitializedGreyscalePixelArray(image_width, image_height, 0.000)
+    if compute_magnitude:
+        edge_magnitude = createInitializedGreyscalePixelArray(image_width, image_height, 0.000)
+
+    window = [rowValues(pixel_array, height) for height in range(min(2, image_height))]
+    for height in range(1, image_height - 1):
+        window.append(rowValues(pixel_array, height + 1))
+        (horizontal_row, vertical_row, magnitude_row) = computeSobelRow(*window)
+        del window[0]
+        if compute_horizontal:
+            horizontal_edges[height][1:image_width - 1] = array('d', horizontal_row)
+        if compute_vertical:
+            vertical_edges[height][1:image_width - 1] = array('d', vertical_row)
+        if compute_magnitude:
+            edge_magnitude[height][1:image_width - 1] = array('d', magnitude_row)
+
+    return (horizontal_edges, vertical_edges, edge_magnitude)
+
+
 def computeBoxAveraging3x3(pixel_array, image_width, image_height):
-    edges = []
+    # border pixels stay at 0.000
+    edges = createInitializedGreyscalePixelArray(image_width, image_height, 0.000)
+    window = [rowValues(pixel_array, height) for height in range(min(2, image_height))]
+    for height in range(1, image_height - 1):
+        window.append(rowValues(pixel_array, height + 1))
+        (above, row, below) = window
+        # the nine values are added in the same order as the original pixel by pixel sum
+        edges[height][1:image_width - 1] = array('d', [
+            round((top_left + top + top_right + left + middle + right + bottom_left + bottom + bottom_right) / 9, 3)
+            for (top_left, top, top_right, left, middle, right, bottom_left, bottom, bottom_right) in
+            zip(above, above[1:], above[2:], row, row[1:], row[2:], below, below[1:], below[2:])])
+        del window[0]
+
+    return edges
+
+
+# Box averaging with a kernel_size x kernel_size window (kernel_size odd) using separable running sums: every row
+# is summed horizontally through its prefix sums, and the window sums of kernel_size rows are kept up to date by
+# adding the row entering the window and subtracting the row leaving it. The cost per pixel does not depend on
+# kernel_size. As with computeBoxAveraging3x3, pixels closer than kernel_size // 2 to the border are 0.000 and
+# results are rounded to 3 decimals; for kernel_size 3 the results equal computeBoxAveraging3x3 up to the order in
+# which floating point sums are added.
+def computeBoxAveraging(pixel_array, image_width, image_height, kernel_size = 3):
+    radius = kernel_size // 2
+    edges = createInitializedGreyscalePixelArray(image_width, image_height, 0.000)
+    if image_width <= 2 * radius or image_height <= 2 * radius:
+        return edges
+
+    area = kernel_size * kernel_size
+    row_sums = []
     for height in range(image_height):
-        row = []
-        for width in range(image_width):
-            sum = 0
-            if height == 0 or width == 0 or height == image_height - 1 or width == image_width - 1:
-                row.append(0.000)
-            else:
-                sum += pixel_array[height - 1][width - 1]
-                sum += pixel_array[height - 1][width]
-                sum += pixel_array[height - 1][width + 1]
-                sum += pixel_array[height][width - 1]
-                sum += pixel_array[height][width]
-                sum += pixel_array[height][width + 1]
-                sum += pixel_array[height + 1][width - 1]
-                sum += pixel_array[height + 1][width]
-                sum += pixel_array[height + 1][width + 1]
-
-                row.append(round(sum / 9, 3))
-        edges.append(row)
+        prefix = list(itertools.accumulate(pixel_array[height], initial=0))
+        row_sums.append([right - left for (left, right) in zip(prefix, prefix[kernel_size:])])
+
+    window_sums = [0] * (image_width - 2 * radius)
+    for height in range(kernel_size):
+        window_sums = [window + value for (window, value) in zip(window_sums, row_sums[height])]
+
+    for height in range(radius, image_height - radius):
+        if height > radius:
+            window_sums = [window + entering - leaving for (window, entering, leaving)
+                           in zip(window_sums, row_sums[height + radius], row_sums[height - radius - 1])]
+        edges[height][radius:image_width - radius] = array('d', [round(window / area, 3) for window in window_sums])
 
     return edges
 
 
+# Weights of `repeat` passes of the 3 pixel average along a line of `length` pixels, where every pass sets the first
+# and last pixel to 0, as computeBoxAveraging3x3 does. Because both the 3x3 average and the border are separable,
+# repeat passes of computeBoxAveraging3x3 are this 1D operator applied to every row and then to every column.
+# Returns (kernel, border): the 2 * repeat + 1 weights shared by all positions at least repeat away from both ends,
+# and a dict mapping every other position to its list of (input position, weight).
+def repeatedBoxAveragingWeights(length, repeat):
+    kernel = [1]
+    for i in range(repeat):
+        kernel = [sum(kernel[max(0, k - 2):k + 1]) for k in range(len(kernel) + 2)]
+    kernel = [weight / 3 ** repeat for weight in kernel]
+
+    border = {}
+    for position in range(length):
+        if repeat <= position < length - repeat:
+            continue
+        weights = {position: 1}
+        for i in range(repeat):
+            spread = {}
+            for (index, weight) in weights.items():
+                if index == 0 or index == length - 1:
+                    continue
+                for neighbour in (index - 1, index, index + 1):
+                    spread[neighbour] = spread.get(neighbour, 0) + weight / 3
+            weights = spread
+        border[position] = sorted(weights.items())
+
+    return (kernel, border)
+
+
+# applies computeBoxAveraging3x3 `repeat` times, the exact smoothing of the pipeline
+def computeBoxAveraging3x3Passes(pixel_array, image_width, image_height, repeat):
+    smoothed = pixel_array
+    for i in range(repeat):
+        smoothed = computeBoxAveraging3x3(smoothed, image_width, image_height)
+    return smoothed
+
+
+# Equivalent to applying computeBoxAveraging3x3 `repeat` times, fused into a single application of the combined
+# separable kernel (2 * repeat + 1 weights per direction) instead of repeat full passes. The repeated version rounds
+# to 3 decimals after every pass and this one only once, so results differ from it by at most
+# 0.0005 * (repeat + 1). Those differences can move a pixel across the threshold, so detection results of the two
+# occasionally differ by a few pixels; detect_qr only uses this one with fused_smoothing=True.
+def computeRepeatedBoxAveraging3x3(pixel_array, image_width, image_height, repeat):
+    (kernel_x, border_x) = repeatedBoxAveragingWeights(image_width, repeat)
+    (kernel_y, border_y) = repeatedBoxAveragingWeights(image_height, repeat)
+
+    horizontal = [smoothRepeatedBoxAveragingRow(pixel_array[height], kernel_x, border_x)
+                  for height in range(image_height)]
+
+    edges = createInitializedGreyscalePixelArray(image_width, image_height, 0.000)
+    for height in range(image_height):
+        edges[height][:] = array('d', combineRepeatedBoxAveragingRows(horizontal, height, kernel_y, border_y))
+
+    return edges
+
+
+# the horizontal half of computeRepeatedBoxAveraging3x3 for one row, with the weights of repeatedBoxAveragingWeights
+def smoothRepeatedBoxAveragingRow(row, kernel, border):
+    row = list(row)
+    image_width = len(row)
+    repeat = len(kernel) // 2
+
+    smoothed = [0.0] * image_width
+    count = image_width - 2 * repeat
+    if count > 0:
+        interior = [kernel[0] * value for value in row[:count]]
+        for k in range(1, len(kernel)):
+            weight = kernel[k]
+            interior = [total + weight * value for (total, value) in zip(interior, row[k:k + count])]
+        smoothed[repeat:image_width - repeat] = interior
+    for (width, weights) in border.items():
+        smoothed[width] = sum(weight * row[index] for (index, weight) in weights)
+
+    return smoothed
+
+
+# the vertical half of computeRepeatedBoxAveraging3x3 for output row `height`, rounded to 3 decimals; rows maps
+# (at least) the row indices height - repeat to height + repeat to horizontally smoothed rows
+def combineRepeatedBoxAveragingRows(rows, height, kernel, border):
+    repeat = len(kernel) // 2
+    if height in border:
+        weights = border[height]
+    else:
+        weights = list(zip(range(height - repeat, height + repeat + 1), kernel))
+
+    smoothed = [0.0] * len(rows[height])
+    for (index, weight) in weights:
+        smoothed = [total + weight * value for (total, value) in zip(smoothed, rows[index])]
+
+    return [round(value, 3) for value in smoothed]
+
+
 def contrast_stretch(pixel_array, image_width, image_height):
     g_max = 255
     g_low = 0
@@ -169,9 +380,10 @@ def contrast_stretch(pixel_array, image_width, image_height):
     low_list = []
     high_list = []
 
-    for height in range(image_height):
-        low_list.append(min(pixel_array[height]))
-        high_list.append(max(pixel_array[height]))
+    rows = [rowValues(pixel_array, height) for height in range(image_height)]
+    for row in rows:
+        low_list.append(min(row))
+        high_list.append(max(row))
 
     f_high = max(high_list)
     f_low = min(low_list)
@@ -180,149 +392,166 @@ def contrast_stretch(pixel_array, image_width, image_height):
     b = g_low - f_low * ((g_max - g_low) / (f_high - f_low))
 
     for height in range(image_height):
-        for width in range(image_width):
-            pixel = pixel_array[height][width]
-
+        stretched_row = []
+        for pixel in rows[height]:
             if pixel < g_low:
-                contrast_stretched_array[height][width] = 0
+                stretched_row.append(0)
             elif pixel >= g_low and pixel <= g_max:
-                contrast_stretched_array[height][width] = a * pixel + b
+                stretched_row.append(a * pixel + b)
             elif pixel > g_max:
-                contrast_stretched_array[height][width] = 255
+                stretched_row.append(255)
+            else:
+                # NaN, which the comparisons above all reject
+                stretched_row.append(0)
+        contrast_stretched_array[height][:] = array('d', stretched_row)
 
     return contrast_stretched_array
 
 
 def computeThresholdGE(pixel_array, threshold_value, image_width, image_height):
-    edges = []
+    edges = createInitializedGreyscalePixelArray(image_width, image_height, typecode='B')
 
     for height in range(image_height):
-        row = []
-        for width in range(image_width):
-            if pixel_array[height][width] < threshold_value:
-                row.append(0)
-            else:
-                row.append(255)
-        edges.append(row)
+        edges[height][:] = array('B', [255 if pixel >= threshold_value else 0
+                                       for pixel in rowValues(pixel_array, height)])
 
     return edges
 
 
+# pixels >= 1 are foreground; the result holds 0 and 1. Works on a bit-packed copy of the image, see BinaryImage.
 def computeErosion8Nbh3x3FlatSE(pixel_array, image_width, image_height):
-    padded_array = createInitializedGreyscalePixelArray(image_width + 2, image_height + 2)
-    edges = []
-
-    for height in range(image_height):
-        for width in range(image_width):
-            padded_array[height + 1][width + 1] = pixel_array[height][width]
-
-    for height in range(1, image_height + 1):
-        row = []
-        for width in range(1, image_width + 1):
-            if padded_array[height - 1][width - 1] >= 1 and padded_array[height - 1][width] >= 1 and \
-                    padded_array[height - 1][width + 1] >= 1 and padded_array[height][width - 1] >= 1 and \
-                    padded_array[height][width] >= 1 and padded_array[height][width + 1] >= 1 and \
-                    padded_array[height + 1][width - 1] >= 1 and padded_array[height + 1][width] >= 1 and \
-                    padded_array[height + 1][width + 1] >= 1:
-                row.append(1)
-            else:
-                row.append(0)
-        edges.append(row)
+    binary_image = BinaryImage.fromPixelArray(pixel_array, image_width, image_height)
 
-    return edges
+    return binary_image.erode3x3().toPixelArray()
 
 
+# pixels >= 1 are foreground; the result holds 0 and 1. Works on a bit-packed copy of the image, see BinaryImage.
 def computeDilation8Nbh3x3FlatSE(pixel_array, image_width, image_height):
-    padded_array = createInitializedGreyscalePixelArray(image_width + 2, image_height + 2)
-    edges = []
-
+    binary_image = BinaryImage.fromPixelArray(pixel_array, image_width, image_height)
+
+    return binary_image.dilate3x3().toPixelArray()
+
+
+# returns the root of a provisional label in the union-find forest, compressing the path on the way
+def findRootLabel(parent, label):
+    root = label
+    while parent[root] != root:
+        root = parent[root]
+    while parent[label] != root:
+        (parent[label], label) = (root, parent[label])
+    return root
+
+
+# Two-pass 4-connected component labeling. The first raster scan gives every foreground pixel a provisional
+# label taken from its left or upper neighbour and records label equivalences in a union-find forest; the second
+# pass replaces provisional labels with final ones. Final labels are numbered in the order in which the raster
+# scan first reaches each component.
+#
+# If compute_statistics is True, a third result is a statistics table mapping each label to a dict with the
+# component's pixel count 'size', 'bounding_box' (min_x, min_y, max_x, max_y), 'centroid' (x, y) and 'perimeter'
+# (number of pixel edges between the component and the background), all gathered during the first pass, so that
+# questions about components become lookups instead of further scans over the label image.
+def computeConnectedComponentLabeling(pixel_array, image_width, image_height, compute_statistics = False):
+    image_array = createInitializedGreyscalePixelArray(image_width, image_height, typecode='I')
+
+    # index 0 is the background, provisional labels start at 1
+    parent = [0]
+    sizes = [0]
+    # per provisional label: [sum_x, sum_y, min_x, min_y, max_x, max_y, perimeter]
+    statistics = [None]
+
+    above = None
     for height in range(image_height):
+        row = pixel_array[height]
+        labels = image_array[height]
+        left = 0
         for width in range(image_width):
-            padded_array[height + 1][width + 1] = pixel_array[height][width]
-
-    for height in range(1, image_height + 1):
-        row = []
-        for width in range(1, image_width + 1):
-            if padded_array[height - 1][width - 1] >= 1 or padded_array[height - 1][width] >= 1 or \
-                    padded_array[height - 1][width + 1] >= 1 or padded_array[height][width - 1] >= 1 or \
-                    padded_array[height][width] >= 1 or padded_array[height][width + 1] >= 1 or \
-                    padded_array[height + 1][width - 1] >= 1 or padded_array[height + 1][width] >= 1 or \
-                    padded_array[height + 1][width + 1] >= 1:
-                row.append(1)
+            if row[width] < 1:
+                left = 0
+                continue
+
+            up = above[width] if above is not None else 0
+            if left and up:
+                label = left
+                if left != up:
+                    root_left = findRootLabel(parent, left)
+                    root_up = findRootLabel(parent, up)
+                    if root_left < root_up:
+                        parent[root_up] = root_left
+                    elif root_up < root_left:
+                        parent[root_left] = root_up
+            elif left or up:
+                label = left or up
             else:
-                row.append(0)
-        edges.append(row)
-
-    return edges
-
-
-class Queue:
-    def __init__(self):
-        self.items = []
-
-    def isEmpty(self):
-        return self.items == []
-
-    def enqueue(self, item):
-        self.items.insert(0,item)
-
-    def dequeue(self):
-        return self.items.pop()
-
-    def size(self):
-        return len(self.items)
-
-
-def computeConnectedComponentLabeling(pixel_array, image_width, image_height):
-    current_label = 1
+                label = len(parent)
+                parent.append(label)
+                sizes.append(0)
+                statistics.append([0, 0, width, height, width, height, 0])
+
+            labels[width] = label
+            sizes[label] += 1
+            if compute_statistics:
+                label_statistics = statistics[label]
+                label_statistics[0] += width
+                label_statistics[1] += height
+                if width < label_statistics[2]:
+                    label_statistics[2] = width
+                if width > label_statistics[4]:
+                    label_statistics[4] = width
+                label_statistics[5] = height
+                # every pixel adds its four edges, minus the two sides of each edge shared with the left and
+                # upper neighbour (which always belong to the same component)
+                label_statistics[6] += 4 - (2 if left else 0) - (2 if up else 0)
+            left = label
+        above = labels
+
+    # roots are always the smallest provisional label of their component, which is the label created at the
+    # component's first pixel in raster order, so visiting provisional labels in order numbers components
+    # the same way a raster scan would
+    final_labels = [0] * len(parent)
     a_dict = {}
-    image_array = createInitializedGreyscalePixelArray(image_width, image_height)
-    padded_array = createInitializedGreyscalePixelArray(image_width + 1, image_height + 1)
-    q = Queue()
-    visited = createInitializedGreyscalePixelArray(image_width, image_height)
+    merged_statistics = {}
+    for label in range(1, len(parent)):
+        root = findRootLabel(parent, label)
+        if root == label:
+            final_labels[label] = len(a_dict) + 1
+            a_dict[final_labels[label]] = 0
+            if compute_statistics:
+                merged_statistics[final_labels[label]] = list(statistics[label])
+        else:
+            final_labels[label] = final_labels[root]
+            if compute_statistics:
+                merged = merged_statistics[final_labels[label]]
+                label_statistics = statistics[label]
+                merged[0] += label_statistics[0]
+                merged[1] += label_statistics[1]
+                merged[2] = min(merged[2], label_statistics[2])
+                merged[3] = min(merged[3], label_statistics[3])
+                merged[4] = max(merged[4], label_statistics[4])
+                merged[5] = max(merged[5], label_statistics[5])
+                merged[6] += label_statistics[6]
+        a_dict[final_labels[label]] += sizes[label]
 
     for height in range(image_height):
-        for width in range(image_width):
-            padded_array[height + 1][width + 1] = pixel_array[height][width]
-
-    for height in range(1, image_height + 1):
-        for width in range(1, image_width + 1):
-            if padded_array[height][width] >= 1 and visited[height][width] == 0:
-                q.enqueue((height, width))
+        labels = image_array[height]
+        labels[:] = array('I', [final_labels[label] for label in labels])
 
-                object_num_pixels = 0
+    if not compute_statistics:
+        return (image_array, a_dict)
 
-                while not q.isEmpty():
-                    (h, w) = q.dequeue()
-                    object_num_pixels += 1
+    component_statistics = {}
+    for label in a_dict:
+        (sum_x, sum_y, min_x, min_y, max_x, max_y, perimeter) = merged_statistics[label]
+        component_statistics[label] = {'size': a_dict[label],
+                                       'bounding_box': (min_x, min_y, max_x, max_y),
+                                       'centroid': (sum_x / a_dict[label], sum_y / a_dict[label]),
+                                       'perimeter': perimeter}
 
-                    image_array[h - 1][w - 1] = current_label
-                    
-                    visited[h][w] = 1
+    return (image_array, a_dict, component_statistics)
 
-                    if padded_array[h][w - 1] >= 1 and visited[h][w - 1] == 0:
-                        visited[h][w - 1] = 1
-                        q.enqueue((h, w - 1))
 
-                    if padded_array[h][w + 1] >= 1 and visited[h][w + 1] == 0:
-                        visited[h][w + 1] = 1
-                        q.enqueue((h, w + 1))
-
-                    if padded_array[h - 1][w] >= 1 and visited[h - 1][w] == 0:
-                        visited[h - 1][w] = 1
-                        q.enqueue((h - 1, w))
-
-                    if padded_array[h + 1][w] >= 1 and visited[h + 1][w] == 0:
-                        visited[h + 1][w] = 1
-                        q.enqueue((h + 1, w))
-
-                a_dict[current_label] = object_num_pixels
-                current_label += 1
-
-    return (image_array, a_dict)
-
-
-def find_largest_component(pixel_array, component_sizes, image_width, image_height):
+# returns the label of the largest component (the smallest such label on ties), or 0 if there are no components
+def find_largest_component_label(component_sizes):
     largest_label = 0
     largest_number = 0
 
@@ -331,6 +560,12 @@ def find_largest_component(pixel_array, component_sizes, image_width, image_heig
             largest_number = component_sizes[key]
             largest_label = key
 
+    return largest_label
+
+
+def find_largest_component(pixel_array, component_sizes, image_width, image_height):
+    largest_label = find_largest_component_label(component_sizes)
+
     for height in range(image_height):
         for width in range(image_width):
             if pixel_array[height][width] != largest_label:
@@ -366,58 +601,185 @@ def bounding_box(pixel_array, image_width, image_height):
     return (min_x, min_y, max_x, max_y)
 
 
-def main():
-    filename = "./images/covid19QRCode/poster1small.png"
-
-    # we read in the png file, and receive three pixel arrays for red, green and blue components, respectively
-    # each pixel array contains 8 bit integer values between 0 and 255 encoding the color values
-    (image_width, image_height, px_array_r, px_array_g, px_array_b) = readRGBImageToSeparatePixelArrays(filename)
-
-    greyscale_pixel_array = computeRGBToGreyscale(px_array_r, px_array_g, px_array_b, image_width, image_height)
-    horizontal_sobel_array = computeHorizontalEdgesSobel(greyscale_pixel_array, image_width, image_height)
-    vertical_sobel_array = computeVerticalEdgesSobel(greyscale_pixel_array, image_width, image_height)
-    edge_magnitude = get_edge_magnitude(horizontal_sobel_array, vertical_sobel_array, image_width, image_height)
-
-    smoothing_repeat = 9
-    smoothed_image = edge_magnitude
-    while smoothing_repeat != 0:
-        smoothed_image = computeBoxAveraging3x3(smoothed_image, image_width, image_height)
-        smoothing_repeat -= 1
-
-    contrast_stretched_image = contrast_stretch(smoothed_image, image_width, image_height)
-
-    threshold_value = 70
+# bounding box of the largest component, looked up in the statistics table of computeConnectedComponentLabeling;
+# returns the same result as bounding_box(find_largest_component(...)) without scanning the label image
+def largest_component_bounding_box(component_sizes, component_statistics):
+    largest_label = find_largest_component_label(component_sizes)
+    if largest_label == 0:
+        return (None, None, 0, 0)
+
+    return component_statistics[largest_label]['bounding_box']
+
+
+# Mean value of pixel_array (for example the edge magnitude) inside every component's bounding box, as a score for
+# how much QR-code-like texture a candidate contains. The integral image makes each score four lookups, so scoring
+# does not get slower with larger candidates.
+def component_densities(pixel_array, component_statistics, image_width, image_height):
+    integral_image = IntegralImage(pixel_array, image_width, image_height)
+
+    densities = {}
+    for (label, statistics) in component_statistics.items():
+        densities[label] = integral_image.rectangleMean(*statistics['bounding_box'])
+
+    return densities
+
+
+# the pipeline functions that have a whole-array implementation in NumpyBackend.py
+BACKEND_FUNCTIONS = ["createInitializedGreyscalePixelArray", "readRGBImageToSeparatePixelArrays",
+                     "readGreyscaleImageToPixelArray",
+                     "prepareRGBImageForImshowFromIndividualArrays", "computeRGBToGreyscale",
+                     "computeHorizontalEdgesSobel", "computeVerticalEdgesSobel", "get_edge_magnitude",
+                     "computeSobelGradients",
+                     "computeBoxAveraging3x3", "computeBoxAveraging", "computeRepeatedBoxAveraging3x3",
+                     "contrast_stretch", "computeThresholdGE",
+                     "computeErosion8Nbh3x3FlatSE", "computeDilation8Nbh3x3FlatSE",
+                     "computeConnectedComponentLabeling", "find_largest_component", "bounding_box"]
+
+python_backend = {name: globals()[name] for name in BACKEND_FUNCTIONS}
+current_backend = "python"
+
+
+# Switches the pipeline functions of this module between the pure Python implementations ("python") and the
+# whole-array NumPy implementations ("numpy"). Callers that use QRCodeDetection.<function> (including main)
+# pick up the change; both backends produce identical values.
+def setBackend(name):
+    global current_backend
+
+    if name == "python":
+        implementations = python_backend
+    elif name == "numpy":
+        import NumpyBackend
+        implementations = {name: getattr(NumpyBackend, name) for name in BACKEND_FUNCTIONS}
+    else:
+        raise ValueError("unknown backend {!r}, expected 'python' or 'numpy'".format(name))
+
+    globals().update(implementations)
+    current_backend = name
+
+
+# The result of detect_qr. bounding_box is (min_x, min_y, max_x, max_y) of the largest component, or None if the
+# binary mask is empty; timings holds the seconds spent in every stage; intermediates holds the pixel arrays of the
+# stages (edge magnitude, smoothed, contrast stretched, binary, dilated, eroded and label image) if they were kept.
+class DetectionResult:
+    def __init__(self, image_width, image_height, bounding_box, component_size, timings, intermediates=None):
+        self.width = image_width
+        self.height = image_height
+        self.bounding_box = bounding_box
+        self.component_size = component_size
+        self.timings = timings
+        self.intermediates = intermediates
+
+    def __repr__(self):
+        return "DetectionResult(width={}, height={}, bounding_box={}, component_size={})".format(
+            self.width, self.height, self.bounding_box, self.component_size)
+
+    # a dictionary of plain values that json.dumps accepts, without the intermediate pixel arrays
+    def as_dict(self):
+        return {"width": self.width,
+                "height": self.height,
+                "bounding_box": list(self.bounding_box) if self.bounding_box is not None else None,
+                "component_size": self.component_size,
+                "timings": dict(self.timings)}
+
+
+# Runs the QR code detection of main() without displaying anything. image_or_path is the name of a png file or a
+# greyscale pixel array (a PixelArray, or a NumPy array with the numpy backend); the other parameters are those of the
+# pipeline in main(). fused_smoothing replaces the smoothing_repeat passes of computeBoxAveraging3x3 by the much faster
+# computeRepeatedBoxAveraging3x3, which rounds differently and may change the binary mask by a few pixels (e.g. 3 pixels
+# of the largest component of shanghai.png). With keep_intermediates the result also holds the output of every stage,
+# e.g. to display the binary mask. A StageProfiler (see Instrumentation.py) passed as profiler additionally records CPU
+# time, peak memory and throughput of every stage.
+def detect_qr(image_or_path, smoothing_repeat = 9, threshold_value = 70, dilation_number = 1, erosion_number = 1,
+              keep_intermediates = False, profiler = None, fused_smoothing = False):
+    timings = {}
+    intermediates = {} if keep_intermediates else None
+
+    def measureStage(name, pixels, function, *arguments, **keywords):
+        stage_start = time.perf_counter()
+        if profiler is not None:
+            result = profiler.measure(name, pixels, function, *arguments, **keywords)
+        else:
+            result = function(*arguments, **keywords)
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - stage_start
+        return result
+
+    if isinstance(image_or_path, (str, bytes, os.PathLike)):
+        import imageIO.png
+        image_reader = imageIO.png.Reader(filename=os.fspath(image_or_path))
+        (image_width, image_height, pixels, image_info) = measureStage("decode", 0, image_reader.read_greyscale)
+        greyscale_pixel_array = PixelArray(image_width, image_height, 'B', data=pixels)
+        if profiler is not None:
+            # the image size is only known after decoding
+            profiler.addPixels("decode", image_width * image_height)
+    elif isinstance(image_or_path, PixelArray):
+        (image_width, image_height) = (image_or_path.width, image_or_path.height)
+        greyscale_pixel_array = image_or_path
+    elif hasattr(image_or_path, "shape") and len(image_or_path.shape) == 2:
+        # a greyscale image of the numpy backend
+        (image_height, image_width) = image_or_path.shape
+        greyscale_pixel_array = image_or_path
+    else:
+        raise TypeError("detect_qr expects a file name or a greyscale pixel array, got {}".format(
+            type(image_or_path).__name__))
+
+    def runStage(name, function, *arguments, **keywords):
+        result = measureStage(name, image_width * image_height, function, *arguments, **keywords)
+        if intermediates is not None:
+            intermediates[name] = result
+        return result
+
+    (_, _, edge_magnitude) = runStage("edge_magnitude", computeSobelGradients, greyscale_pixel_array, image_width,
+                                      image_height, compute_horizontal=False, compute_vertical=False)
+    if intermediates is not None:
+        intermediates["edge_magnitude"] = edge_magnitude
+    smoothing = computeRepeatedBoxAveraging3x3 if fused_smoothing else computeBoxAveraging3x3Passes
+    smoothed_image = runStage("smoothed", smoothing, edge_magnitude, image_width, image_height, smoothing_repeat)
+    contrast_stretched_image = runStage("contrast_stretched", contrast_stretch, smoothed_image, image_width,
+                                        image_height)
+    binary_image = runStage("binary", computeThresholdGE, contrast_stretched_image, threshold_value, image_width,
+                            image_height)
+
+    for i in range(dilation_number):
+        binary_image = runStage("dilated", computeDilation8Nbh3x3FlatSE, binary_image, image_width, image_height)
+    for i in range(erosion_number):
+        binary_image = runStage("eroded", computeErosion8Nbh3x3FlatSE, binary_image, image_width, image_height)
+
+    (ccimg, ccsizes, ccstatistics) = runStage("labels", computeConnectedComponentLabeling, binary_image,
+                                              image_width, image_height, compute_statistics=True)
+    if intermediates is not None:
+        intermediates["labels"] = ccimg
+
+    largest_label = find_largest_component_label(ccsizes)
+    if largest_label == 0:
+        return DetectionResult(image_width, image_height, None, 0, timings, intermediates)
+
+    return DetectionResult(image_width, image_height, largest_component_bounding_box(ccsizes, ccstatistics),
+                           ccsizes[largest_label], timings, intermediates)
 
-    binary_image = computeThresholdGE(contrast_stretched_image, threshold_value, image_width, image_height)
 
-    dilation_number = 1
-    erosion_number = 1
-    dilation_array = binary_image
-
-    while dilation_number != 0:
-        dilation_array = computeDilation8Nbh3x3FlatSE(dilation_array, image_width, image_height)
-        dilation_number -= 1
-
-    erosion_array = dilation_array
-
-    while erosion_number != 0:
-        erosion_array = computeErosion8Nbh3x3FlatSE(erosion_array, image_width, image_height)
-        erosion_number -= 1
+def main():
+    # matplotlib is only needed to display the result, detect_qr works without it
+    from matplotlib import pyplot
+    from matplotlib.patches import Rectangle
 
-    (ccimg, ccsizes) = computeConnectedComponentLabeling(erosion_array, image_width, image_height)
+    filename = "./images/covid19QRCode/poster1small.png"
 
-    largest_component_array = find_largest_component(ccimg, ccsizes, image_width, image_height)
+    # detection reads the png file straight to greyscale, it never needs the colour channels
+    result = detect_qr(filename, smoothing_repeat=9, threshold_value=70, dilation_number=1, erosion_number=1)
 
-    (min_x, min_y, max_x, max_y) = bounding_box(largest_component_array, image_width, image_height)
+    # only the visualisation needs the colours, and imshow takes the decoded rows as they are
+    (image_width, image_height, rgb_image) = readRGBImageForImshow(filename)
 
-    pyplot.imshow(prepareRGBImageForImshowFromIndividualArrays(px_array_r, px_array_g, px_array_b, image_width, image_height))
+    pyplot.imshow(rgb_image)
 
     # get access to the current pyplot figure
     axes = pyplot.gca()
     # create a 70x50 rectangle that starts at location 10,30, with a line width of 3
-    rect = Rectangle((min_x, min_y), max_x - min_x, max_y - min_y, linewidth=3, edgecolor='g', facecolor='none')
-    # paint the rectangle over the current plot
-    axes.add_patch(rect)
+    if result.bounding_box is not None:
+        (min_x, min_y, max_x, max_y) = result.bounding_box
+        rect = Rectangle((min_x, min_y), max_x - min_x, max_y - min_y, linewidth=3, edgecolor='g', facecolor='none')
+        # paint the rectangle over the current plot
+        axes.add_patch(rect)
 
     # plot the current figure
     pyplot.show()
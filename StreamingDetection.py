@@ -0,0 +1,216 @@
+import re
+
+import imageIO.png
+from BinaryImage import packRow, dilateRow, dilateRows, erodeRow, erodeRows
+from QRCodeDetection import findRootLabel, computeSobelRow, repeatedBoxAveragingWeights, \
+    smoothRepeatedBoxAveragingRow, combineRepeatedBoxAveragingRows
+
+
+# Streaming execution of the QR code detection pipeline of QRCodeDetection.main(). Decoded scanlines flow through
+# generators, one per stage, each keeping only the rows its neighbourhood needs: 3 rows for the Sobel and
+# morphology stages and 2 * smoothing_repeat + 1 rows for the smoothing. Rows are requested from the png reader
+# only when the pipeline needs them, so detection starts while the file is still being decoded and memory is
+# O(image width x kernel height) rather than a dozen full-size intermediate images. Every stage computes exactly
+# the same values as its whole-image counterpart; the smoothing is that of computeRepeatedBoxAveraging3x3, so the
+# results match detect_qr(..., fused_smoothing=True).
+#
+# contrast_stretch needs the minimum and maximum of the whole smoothed image before the first row can be
+# thresholded. Unless that range is passed in as contrast_range, it is measured by a first streaming pass, which
+# decodes the image a second time; memory stays bounded either way.
+
+
+def greyscaleRows(input_filename):
+    image_reader = imageIO.png.Reader(filename=input_filename)
+    (image_width, image_height, rows, image_info) = image_reader.iter_greyscale()
+    return (image_width, image_height, rows)
+
+
+# edge magnitude rows, as computed by computeSobelGradients
+def edgeMagnitudeRows(rows, image_width, image_height):
+    window = []
+    for row in rows:
+        window.append(row)
+        if len(window) == 1:
+            yield [0.0] * image_width
+        elif len(window) == 3:
+            magnitude_row = [0.0] * image_width
+            magnitude_row[1:image_width - 1] = computeSobelRow(*window)[2]
+            yield magnitude_row
+            window.pop(0)
+    if len(window) > 1:
+        yield [0.0] * image_width
+
+
+# rows of computeRepeatedBoxAveraging3x3
+def repeatedBoxAveragingRows(rows, image_width, image_height, repeat):
+    (kernel_x, border_x) = repeatedBoxAveragingWeights(image_width, repeat)
+    (kernel_y, border_y) = repeatedBoxAveragingWeights(image_height, repeat)
+
+    # horizontally smoothed rows by row index; output row y needs rows y - repeat to y + repeat
+    window = {}
+    next_output = 0
+    for (height, row) in enumerate(rows):
+        window[height] = smoothRepeatedBoxAveragingRow(row, kernel_x, border_x)
+        while next_output <= height - repeat:
+            yield combineRepeatedBoxAveragingRows(window, next_output, kernel_y, border_y)
+            window.pop(next_output - repeat, None)
+            next_output += 1
+    while next_output < image_height:
+        yield combineRepeatedBoxAveragingRows(window, next_output, kernel_y, border_y)
+        next_output += 1
+
+
+def smoothedRows(input_filename, smoothing_repeat):
+    (image_width, image_height, rows) = greyscaleRows(input_filename)
+    rows = edgeMagnitudeRows(rows, image_width, image_height)
+    rows = repeatedBoxAveragingRows(rows, image_width, image_height, smoothing_repeat)
+    return (image_width, image_height, rows)
+
+
+# (f_low, f_high) of the smoothed image, as found by contrast_stretch
+def measureContrastRange(input_filename, smoothing_repeat = 9):
+    (image_width, image_height, rows) = smoothedRows(input_filename, smoothing_repeat)
+
+    f_low = None
+    f_high = None
+    for row in rows:
+        if f_low is None or min(row) < f_low:
+            f_low = min(row)
+        if f_high is None or max(row) > f_high:
+            f_high = max(row)
+
+    return (f_low, f_high)
+
+
+# contrast_stretch followed by computeThresholdGE; yields bit-packed rows (see BinaryImage) of foreground pixels
+def thresholdRows(rows, contrast_range, threshold_value):
+    g_max = 255
+    g_low = 0
+    (f_low, f_high) = contrast_range
+
+    a = (g_max - g_low) / (f_high - f_low)
+    b = g_low - f_low * ((g_max - g_low) / (f_high - f_low))
+
+    for row in rows:
+        stretched = [0 if pixel < g_low else a * pixel + b if pixel <= g_max else 255 for pixel in row]
+        yield packRow(stretched, threshold_value)
+
+
+# computeDilation8Nbh3x3FlatSE on bit-packed rows
+def dilationRows(rows, image_width):
+    mask = (1 << image_width) - 1
+    above = 0
+    current = None
+    for row in rows:
+        below = dilateRow(row, mask)
+        if current is not None:
+            yield dilateRows(above, current, below)
+            above = current
+        current = below
+    if current is not None:
+        yield dilateRows(above, current, 0)
+
+
+# computeErosion8Nbh3x3FlatSE on bit-packed rows
+def erosionRows(rows, image_width):
+    above = 0
+    current = None
+    for row in rows:
+        below = erodeRow(row)
+        if current is not None:
+            yield erodeRows(above, current, below)
+            above = current
+        current = below
+    if current is not None:
+        yield erodeRows(above, current, 0)
+
+
+# Streaming 4-connected component labeling of bit-packed rows. Only the runs of foreground pixels of the previous
+# row are kept, together with the size and bounding box of every component found so far, merged whenever runs
+# join two components. Returns (bounding box, size) of the largest component, choosing the component that a
+# raster scan reaches first on ties, like largest_component_bounding_box; (None, None, 0, 0) and 0 if there is none.
+def largestComponentOfRows(rows, image_width):
+    # union-find over provisional labels, index 0 unused
+    parent = [0]
+    # per root label: [size, min_x, min_y, max_x, max_y]
+    statistics = {}
+
+    previous_runs = []
+    for (height, row) in enumerate(rows):
+        bits = format(row, '0{}b'.format(image_width))[::-1] if image_width > 0 else ''
+        runs = []
+        i = 0
+        for match in re.finditer('1+', bits):
+            (start, end) = match.span()
+            label = None
+            # previous_runs are sorted, skip those that end before this run starts
+            while i < len(previous_runs) and previous_runs[i][1] <= start:
+                i += 1
+            j = i
+            while j < len(previous_runs) and previous_runs[j][0] < end:
+                root = findRootLabel(parent, previous_runs[j][2])
+                if label is None:
+                    label = root
+                elif root != label:
+                    (keep, merge) = (min(root, label), max(root, label))
+                    parent[merge] = keep
+                    kept = statistics[keep]
+                    merged = statistics.pop(merge)
+                    kept[0] += merged[0]
+                    kept[1] = min(kept[1], merged[1])
+                    kept[2] = min(kept[2], merged[2])
+                    kept[3] = max(kept[3], merged[3])
+                    kept[4] = max(kept[4], merged[4])
+                    label = keep
+                j += 1
+            # the last overlapping run may also overlap the next run of this row
+            i = max(i, j - 1)
+
+            if label is None:
+                label = len(parent)
+                parent.append(label)
+                statistics[label] = [0, start, height, end - 1, height]
+            component = statistics[label]
+            component[0] += end - start
+            component[1] = min(component[1], start)
+            component[3] = max(component[3], end - 1)
+            component[4] = height
+            runs.append((start, end, label))
+        previous_runs = runs
+
+    largest_label = 0
+    largest_size = 0
+    for label in sorted(statistics):
+        if statistics[label][0] > largest_size:
+            largest_size = statistics[label][0]
+            largest_label = label
+
+    if largest_label == 0:
+        return ((None, None, 0, 0), 0)
+    (size, min_x, min_y, max_x, max_y) = statistics[largest_label]
+    return ((min_x, min_y, max_x, max_y), size)
+
+
+# Bit-packed rows of the eroded binary mask that main() passes to computeConnectedComponentLabeling.
+def binaryMaskRows(input_filename, smoothing_repeat = 9, threshold_value = 70, dilation_number = 1,
+                   erosion_number = 1, contrast_range = None):
+    if contrast_range is None:
+        contrast_range = measureContrastRange(input_filename, smoothing_repeat)
+
+    (image_width, image_height, rows) = smoothedRows(input_filename, smoothing_repeat)
+    rows = thresholdRows(rows, contrast_range, threshold_value)
+    for i in range(dilation_number):
+        rows = dilationRows(rows, image_width)
+    for i in range(erosion_number):
+        rows = erosionRows(rows, image_width)
+
+    return (image_width, image_height, rows)
+
+
+# Runs the whole detection of main() in streaming mode. Returns ((min_x, min_y, max_x, max_y), component size) of
+# the largest component of the binary mask.
+def detectQRCodeStreaming(input_filename, smoothing_repeat = 9, threshold_value = 70, dilation_number = 1,
+                          erosion_number = 1, contrast_range = None):
+    (image_width, image_height, rows) = binaryMaskRows(input_filename, smoothing_repeat, threshold_value,
+                                                       dilation_number, erosion_number, contrast_range)
+    return largestComponentOfRows(rows, image_width)
@@ -0,0 +1,129 @@
+import functools
+import math
+import multiprocessing
+import os
+import sys
+from array import array
+from multiprocessing import resource_tracker, shared_memory
+
+from PixelArray import PixelArray
+
+
+# Runs neighbourhood stages of the detection pipeline (or a fused chain of them) on horizontal bands of the image in a
+# multiprocessing pool. Input and output pixels live in shared memory blocks, so only the block names and band
+# coordinates are sent to the workers instead of pickled pixel lists.
+#
+# Every band is extended by `halo` rows above and below, so the stages see the same neighbourhood as on the whole
+# image; only the band's own rows are written back. A chain of n 3x3 stages needs a halo of n rows (the default);
+# computeRepeatedBoxAveraging3x3 with `repeat` passes counts as repeat stages. With enough halo rows the stitched
+# result is identical to running the stages serially on the whole image.
+#
+# Stages are functions taking (pixel_array, image_width, image_height) and returning a pixel array, for example
+# computeBoxAveraging3x3 or computeErosion8Nbh3x3FlatSE; use functools.partial for stages with more arguments.
+# They have to be picklable, i.e. module-level functions.
+
+
+# Attaches to a shared memory block created by runStagesTiled without registering it with the resource tracker; only
+# the creating process owns the block. Before Python 3.13 attaching always registers it, and a worker with a tracker
+# of its own (e.g. one of a pool created before any shared memory) then reports the block as leaked and tries to
+# unlink it again after runStagesTiled has unlinked it. Pool workers run one task at a time, so registration is
+# switched off just while attaching.
+def attachSharedMemory(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def processBand(stages, input_name, input_typecode, output_name, output_typecode, image_width, image_height,
+                start, end, halo):
+    band_start = max(0, start - halo)
+    band_end = min(image_height, end + halo)
+    input_itemsize = array(input_typecode).itemsize
+    output_itemsize = array(output_typecode).itemsize
+
+    input_memory = attachSharedMemory(input_name)
+    try:
+        band = array(input_typecode)
+        band.frombytes(input_memory.buf[band_start * image_width * input_itemsize:
+                                        band_end * image_width * input_itemsize])
+    finally:
+        input_memory.close()
+
+    pixel_array = PixelArray(image_width, band_end - band_start, input_typecode, data=band)
+    for stage in stages:
+        pixel_array = stage(pixel_array, image_width, band_end - band_start)
+
+    rows = array(output_typecode)
+    for height in range(start - band_start, end - band_start):
+        rows.extend(array(output_typecode, pixel_array[height]))
+
+    output_memory = attachSharedMemory(output_name)
+    try:
+        output_memory.buf[start * image_width * output_itemsize:end * image_width * output_itemsize] = rows.tobytes()
+    finally:
+        output_memory.close()
+
+
+def runStagesTiled(stages, pixel_array, image_width, image_height, halo = None, output_typecode = 'd',
+                   processes = None, pool = None):
+    if halo is None:
+        halo = len(stages)
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    input_typecode = pixel_array.typecode if isinstance(pixel_array, PixelArray) else 'd'
+    input_data = array(input_typecode)
+    if isinstance(pixel_array, PixelArray):
+        input_data = pixel_array.data
+    else:
+        for height in range(image_height):
+            input_data.extend(array(input_typecode, pixel_array[height]))
+
+    input_size = image_width * image_height * array(input_typecode).itemsize
+    output_size = image_width * image_height * array(output_typecode).itemsize
+    input_memory = shared_memory.SharedMemory(create=True, size=max(1, input_size))
+    output_memory = shared_memory.SharedMemory(create=True, size=max(1, output_size))
+    try:
+        input_memory.buf[:input_size] = memoryview(input_data).cast('B')
+
+        band_height = max(1, math.ceil(image_height / processes))
+        tasks = [(stages, input_memory.name, input_typecode, output_memory.name, output_typecode, image_width,
+                  image_height, start, min(image_height, start + band_height), halo)
+                 for start in range(0, image_height, band_height)]
+
+        if pool is None:
+            with multiprocessing.Pool(min(processes, len(tasks) or 1)) as pool:
+                pool.starmap(processBand, tasks)
+        else:
+            pool.starmap(processBand, tasks)
+
+        output_data = array(output_typecode)
+        output_data.frombytes(output_memory.buf[:output_size])
+    finally:
+        input_memory.close()
+        input_memory.unlink()
+        output_memory.close()
+        output_memory.unlink()
+
+    return PixelArray(image_width, image_height, output_typecode, data=output_data)
+
+
+# a single stage, e.g. runStageTiled(computeBoxAveraging3x3, pixel_array, image_width, image_height)
+def runStageTiled(stage, pixel_array, image_width, image_height, halo = 1, output_typecode = 'd', processes = None,
+                  pool = None):
+    return runStagesTiled([stage], pixel_array, image_width, image_height, halo, output_typecode, processes, pool)
+
+
+# computeRepeatedBoxAveraging3x3 on bands, with the halo it needs
+def computeRepeatedBoxAveraging3x3Tiled(pixel_array, image_width, image_height, repeat, processes = None,
+                                        pool = None):
+    from QRCodeDetection import computeRepeatedBoxAveraging3x3
+
+    stage = functools.partial(computeRepeatedBoxAveraging3x3, repeat=repeat)
+    return runStagesTiled([stage], pixel_array, image_width, image_height, halo=repeat, processes=processes,
+                          pool=pool)
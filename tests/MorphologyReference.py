@@ -0,0 +1,26 @@
+# Brute force morphology, as the original computeErosion8Nbh3x3FlatSE and computeDilation8Nbh3x3FlatSE computed it:
+# the minimum or maximum over the offsets of the structuring element, with pixels outside the image counting as 0.
+
+
+def referenceMorphology(pixel_array, image_width, image_height, offsets, operation):
+    def value(x, y):
+        if 0 <= x < image_width and 0 <= y < image_height:
+            return pixel_array[y][x]
+        return 0
+
+    return [[operation(value(x + dx, y + dy) for (dx, dy) in offsets) for x in range(image_width)]
+            for y in range(image_height)]
+
+
+SQUARE_3X3 = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+
+# 1 where the whole 3x3 neighbourhood is >= 1 (erosion) or where any of it is (dilation), else 0
+def referenceErosion3x3(pixel_array, image_width, image_height):
+    binary = [[1 if value >= 1 else 0 for value in pixel_array[y]] for y in range(image_height)]
+    return referenceMorphology(binary, image_width, image_height, SQUARE_3X3, min)
+
+
+def referenceDilation3x3(pixel_array, image_width, image_height):
+    binary = [[1 if value >= 1 else 0 for value in pixel_array[y]] for y in range(image_height)]
+    return referenceMorphology(binary, image_width, image_height, SQUARE_3X3, max)
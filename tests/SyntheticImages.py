@@ -0,0 +1,42 @@
+import random
+from array import array
+
+import imageIO.png
+from PixelArray import PixelArray
+
+
+# Small synthetic test images, generated from a seed so that every run tests the same pixels.
+
+
+# an RGB image of noise with a few bright rectangles, as packed rows
+def syntheticRGBRows(image_width, image_height, seed):
+    generator = random.Random(seed)
+    rows = [bytearray(generator.randrange(60) for i in range(3 * image_width)) for y in range(image_height)]
+    for i in range(4):
+        (left, top) = (generator.randrange(image_width - 8), generator.randrange(image_height - 8))
+        (right, bottom) = (left + generator.randrange(4, 12), top + generator.randrange(4, 12))
+        colour = [generator.randrange(150, 256) for channel in range(3)]
+        for y in range(top, min(bottom, image_height)):
+            for x in range(left, min(right, image_width)):
+                rows[y][3 * x:3 * x + 3] = bytes(colour)
+    return rows
+
+
+def writeRGBImage(filename, rows, image_width, image_height, filter_type = None, bitdepth = 8):
+    with open(filename, 'wb') as output_file:
+        imageIO.png.Writer(image_width, image_height, greyscale=False, filter_type=filter_type,
+                           bitdepth=bitdepth).write(output_file, rows)
+
+
+# a 'B' PixelArray of 0 and 1, where each pixel is 1 with probability density
+def randomBinaryImage(image_width, image_height, seed, density = 0.5):
+    generator = random.Random(seed)
+    data = array('B', (1 if generator.random() < density else 0 for i in range(image_width * image_height)))
+    return PixelArray(image_width, image_height, 'B', data=data)
+
+
+# a 'd' PixelArray of values between 0 and 255
+def randomImage(image_width, image_height, seed):
+    generator = random.Random(seed)
+    return PixelArray(image_width, image_height, 'd',
+                      data=array('d', (generator.uniform(0, 255) for i in range(image_width * image_height))))
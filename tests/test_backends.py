@@ -0,0 +1,65 @@
+import pytest
+
+import QRCodeDetection
+from SyntheticImages import syntheticRGBRows, writeRGBImage
+
+
+# The NumPy backend against the Python backend, which is the reference: every stage of detect_qr has to produce
+# identical values.
+
+
+@pytest.fixture
+def numpyBackend():
+    pytest.importorskip("numpy")
+    QRCodeDetection.setBackend("numpy")
+    yield
+    QRCodeDetection.setBackend("python")
+
+
+def test_numpy_backend_matches_python_backend(tmp_path, numpyBackend):
+    (image_width, image_height) = (44, 36)
+    rows = syntheticRGBRows(image_width, image_height, 9)
+    filename = str(tmp_path / "image.png")
+    writeRGBImage(filename, rows, image_width, image_height)
+
+    numpy_results = [QRCodeDetection.detect_qr(filename, smoothing_repeat=3, keep_intermediates=True,
+                                               fused_smoothing=fused_smoothing)
+                     for fused_smoothing in (False, True)]
+    numpy_greyscale = QRCodeDetection.computeRGBToGreyscale(
+        *QRCodeDetection.readRGBImageToSeparatePixelArrays(filename)[2:], image_width, image_height)
+
+    QRCodeDetection.setBackend("python")
+    python_results = [QRCodeDetection.detect_qr(filename, smoothing_repeat=3, keep_intermediates=True,
+                                                fused_smoothing=fused_smoothing)
+                      for fused_smoothing in (False, True)]
+    python_greyscale = QRCodeDetection.computeRGBToGreyscale(
+        *QRCodeDetection.readRGBImageToSeparatePixelArrays(filename)[2:], image_width, image_height)
+
+    assert numpy_greyscale.tolist() == python_greyscale.tolist()
+    for (numpy_result, python_result) in zip(numpy_results, python_results):
+        assert numpy_result.bounding_box == python_result.bounding_box
+        assert numpy_result.component_size == python_result.component_size
+        for (stage, pixel_array) in python_result.intermediates.items():
+            assert numpy_result.intermediates[stage].tolist() == pixel_array.tolist(), stage
+
+
+def test_16_bit_images_read_the_same_in_both_backends(tmp_path, numpyBackend):
+    (image_width, image_height) = (13, 9)
+    rows = [[(997 * x + 3001 * y + 20011 * channel) % 65536 for x in range(image_width) for channel in range(3)]
+            for y in range(image_height)]
+    filename = str(tmp_path / "image16.png")
+    writeRGBImage(filename, rows, image_width, image_height, bitdepth=16)
+
+    (width, height, r, g, b) = QRCodeDetection.readRGBImageToSeparatePixelArrays(filename)
+    numpy_greyscale = QRCodeDetection.computeRGBToGreyscale(r, g, b, image_width, image_height)
+
+    QRCodeDetection.setBackend("python")
+    (width, height, r, g, b) = QRCodeDetection.readRGBImageToSeparatePixelArrays(filename)
+    assert r.typecode == 'H'
+    assert r.tolist() == [row[0::3] for row in rows]
+    python_greyscale = QRCodeDetection.computeRGBToGreyscale(r, g, b, image_width, image_height)
+
+    assert python_greyscale.typecode == 'H'
+    assert numpy_greyscale.tolist() == python_greyscale.tolist()
+    assert python_greyscale.tolist() == [[round(0.299 * row[x] + 0.587 * row[x + 1] + 0.114 * row[x + 2])
+                                          for x in range(0, 3 * image_width, 3)] for row in rows]
@@ -0,0 +1,34 @@
+import pytest
+
+import QRCodeDetection
+from BinaryImage import BinaryImage
+from MorphologyReference import referenceDilation3x3, referenceErosion3x3
+from SyntheticImages import randomBinaryImage, randomImage
+
+
+# The bit-packed BinaryImage and the 3x3 morphology built on it, against per-pixel references.
+
+
+@pytest.mark.parametrize("seed,density", [(1, 0.2), (2, 0.5), (3, 0.9)])
+def test_3x3_morphology_matches_per_pixel_reference(seed, density):
+    (image_width, image_height) = (21, 14)
+    binary_image = randomBinaryImage(image_width, image_height, seed, density)
+
+    assert QRCodeDetection.computeErosion8Nbh3x3FlatSE(binary_image, image_width, image_height).tolist() == \
+        referenceErosion3x3(binary_image, image_width, image_height)
+    assert QRCodeDetection.computeDilation8Nbh3x3FlatSE(binary_image, image_width, image_height).tolist() == \
+        referenceDilation3x3(binary_image, image_width, image_height)
+
+
+def test_pixel_array_round_trip_and_threshold():
+    (image_width, image_height) = (70, 5)
+    binary_image = randomBinaryImage(image_width, image_height, 4)
+    packed = BinaryImage.fromPixelArray(binary_image, image_width, image_height)
+
+    assert packed.toPixelArray().tolist() == binary_image.tolist()
+    assert packed.countForeground() == sum(map(sum, binary_image.tolist()))
+
+    greyscale = randomImage(image_width, image_height, 5)
+    thresholded = BinaryImage.fromThreshold(greyscale, 100, image_width, image_height)
+    assert thresholded.toPixelArray().tolist() == [[1 if value >= 100 else 0 for value in row]
+                                                   for row in greyscale.tolist()]
@@ -0,0 +1,26 @@
+import imageIO.png
+import QRCodeDetection
+from SyntheticImages import syntheticRGBRows, writeRGBImage
+
+
+# Decoding straight to greyscale against computeRGBToGreyscale on the separately read planes, for the 8-bit
+# non-palette images where the two must agree.
+
+
+def test_greyscale_decoding_matches_luma_of_planes(tmp_path):
+    (image_width, image_height) = (19, 13)
+    rows = syntheticRGBRows(image_width, image_height, 7)
+    filename = str(tmp_path / "image.png")
+    writeRGBImage(filename, rows, image_width, image_height)
+
+    (width, height, pixels, info) = imageIO.png.Reader(filename=filename).read_greyscale()
+    expected = [round(0.299 * row[x] + 0.587 * row[x + 1] + 0.114 * row[x + 2])
+                for row in rows for x in range(0, 3 * image_width, 3)]
+    assert list(pixels) == expected
+
+    (width, height, r, g, b) = QRCodeDetection.readRGBImageToSeparatePixelArrays(filename)
+    greyscale = QRCodeDetection.computeRGBToGreyscale(r, g, b, image_width, image_height)
+    assert [value for row in greyscale.tolist() for value in row] == expected
+
+    (width, height, greyscale) = QRCodeDetection.readGreyscaleImageToPixelArray(filename)
+    assert [value for row in greyscale.tolist() for value in row] == expected
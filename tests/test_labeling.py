@@ -0,0 +1,46 @@
+import pytest
+
+import QRCodeDetection
+from SyntheticImages import randomBinaryImage
+
+
+# Two-pass union-find labeling against breadth-first labeling, the original implementation.
+
+
+# breadth-first 4-connected labeling, numbering components in raster order as the original implementation did
+def referenceLabeling(pixel_array, image_width, image_height):
+    labels = [[0] * image_width for y in range(image_height)]
+    sizes = {}
+    for y in range(image_height):
+        for x in range(image_width):
+            if pixel_array[y][x] < 1 or labels[y][x]:
+                continue
+            label = len(sizes) + 1
+            labels[y][x] = label
+            queue = [(x, y)]
+            for (qx, qy) in queue:
+                for (nx, ny) in ((qx - 1, qy), (qx + 1, qy), (qx, qy - 1), (qx, qy + 1)):
+                    if 0 <= nx < image_width and 0 <= ny < image_height and pixel_array[ny][nx] >= 1 and \
+                            not labels[ny][nx]:
+                        labels[ny][nx] = label
+                        queue.append((nx, ny))
+            sizes[label] = len(queue)
+    return (labels, sizes)
+
+
+@pytest.mark.parametrize("seed,density", [(1, 0.3), (2, 0.5), (3, 0.7), (4, 0.0)])
+def test_union_find_labeling_matches_breadth_first_labeling(seed, density):
+    (image_width, image_height) = (23, 17)
+    binary_image = randomBinaryImage(image_width, image_height, seed, density)
+    (expected_labels, expected_sizes) = referenceLabeling(binary_image, image_width, image_height)
+
+    (labels, sizes, statistics) = QRCodeDetection.computeConnectedComponentLabeling(
+        binary_image, image_width, image_height, compute_statistics=True)
+
+    assert labels.tolist() == expected_labels
+    assert sizes == expected_sizes
+    for (label, size) in expected_sizes.items():
+        pixels = [(x, y) for y in range(image_height) for x in range(image_width) if expected_labels[y][x] == label]
+        assert statistics[label]['size'] == size
+        assert statistics[label]['bounding_box'] == (min(x for (x, y) in pixels), min(y for (x, y) in pixels),
+                                                     max(x for (x, y) in pixels), max(y for (x, y) in pixels))
@@ -0,0 +1,44 @@
+import pytest
+
+import Morphology
+from MorphologyReference import referenceDilation3x3, referenceErosion3x3, referenceMorphology
+from PixelArray import PixelArray
+from SyntheticImages import randomBinaryImage, randomImage
+
+
+# Morphology with sized structuring elements, against iterated 3x3 operations and brute force references.
+
+
+def iterate(operation, pixel_array, image_width, image_height, count):
+    for i in range(count):
+        pixel_array = PixelArray.fromRows(operation(pixel_array, image_width, image_height), image_width,
+                                          image_height, 'B')
+    return pixel_array
+
+
+@pytest.mark.parametrize("iterations", [1, 2, 3])
+def test_rectangle_matches_iterated_3x3_operation(iterations):
+    (image_width, image_height) = (19, 16)
+    binary_image = randomBinaryImage(image_width, image_height, iterations, 0.6)
+    size = 2 * iterations + 1
+
+    eroded = Morphology.erode(binary_image, image_width, image_height, Morphology.rectangle(size, size))
+    assert eroded.tolist() == iterate(referenceErosion3x3, binary_image, image_width, image_height,
+                                      iterations).tolist()
+    dilated = Morphology.dilate(binary_image, image_width, image_height, Morphology.rectangle(size, size))
+    assert dilated.tolist() == iterate(referenceDilation3x3, binary_image, image_width, image_height,
+                                       iterations).tolist()
+
+
+@pytest.mark.parametrize("structuring_element,offsets", [
+    (Morphology.rectangle(5, 3), [(dx, dy) for dy in range(-1, 2) for dx in range(-2, 3)]),
+    (Morphology.cross(5), [(dx, 0) for dx in range(-2, 3)] + [(0, dy) for dy in (-2, -1, 1, 2)]),
+    (Morphology.disk(2), [(dx, dy) for dy in range(-2, 3) for dx in range(-2, 3) if dx * dx + dy * dy <= 4])])
+def test_greyscale_morphology_matches_brute_force(structuring_element, offsets):
+    (image_width, image_height) = (15, 13)
+    pixel_array = randomImage(image_width, image_height, 7)
+
+    assert Morphology.erode(pixel_array, image_width, image_height, structuring_element).tolist() == \
+        referenceMorphology(pixel_array, image_width, image_height, offsets, min)
+    assert Morphology.dilate(pixel_array, image_width, image_height, structuring_element).tolist() == \
+        referenceMorphology(pixel_array, image_width, image_height, offsets, max)
@@ -0,0 +1,169 @@
+import io
+import random
+import struct
+import zlib
+
+import pytest
+
+import imageIO.png
+from SyntheticImages import syntheticRGBRows
+
+
+# Round trips through imageIO.png.Writer and imageIO.png.Reader for the faster reading and writing paths.
+
+
+def gradientRows(image_width, image_height, planes = 3):
+    return [bytearray((3 * x + 5 * y + channel) % 256 for x in range(image_width) for channel in range(planes))
+            for y in range(image_height)]
+
+
+def writePNG(rows, image_width, image_height, **keywords):
+    output_file = io.BytesIO()
+    imageIO.png.Writer(image_width, image_height, **keywords).write(output_file, rows)
+    return output_file.getvalue()
+
+
+# a greyscale png whose header declares image_width x image_height pixels, with a single IDAT chunk that inflates to
+# raw_size zero bytes
+def decompressionBomb(image_width, image_height, raw_size):
+    output_file = io.BytesIO()
+    output_file.write(imageIO.png.signature)
+    imageIO.png.write_chunk(output_file, b'IHDR', struct.pack("!2I5B", image_width, image_height, 8, 0, 0, 0, 0))
+    imageIO.png.write_chunk(output_file, b'IDAT', zlib.compress(bytes(raw_size), 9))
+    imageIO.png.write_chunk(output_file, b'IEND')
+    return output_file.getvalue()
+
+
+def test_read_rows_cannot_corrupt_later_rows():
+    (image_width, image_height) = (11, 9)
+    rows = gradientRows(image_width, image_height)
+    # the Up filter makes every row depend on the row above
+    data = writePNG(rows, image_width, image_height, greyscale=False, filter_type=2)
+
+    decoded = []
+    for row in imageIO.png.Reader(bytes=data).read()[2]:
+        with pytest.raises(TypeError):
+            row[0] = 0
+        decoded.append(bytearray(row))
+    assert decoded == rows
+
+
+@pytest.mark.parametrize("filter_type", [1, 2, 3, 4])
+@pytest.mark.parametrize("filter_unit", [1, 3, 8])
+def test_accelerated_filters_match_plain_filters(filter_type, filter_unit):
+    generator = random.Random(filter_type * 10 + filter_unit)
+    plain = (None, imageIO.png.undo_filter_sub, imageIO.png.undo_filter_up, imageIO.png.undo_filter_average,
+             imageIO.png.undo_filter_paeth)[filter_type]
+    accelerated = (None, imageIO.png.undo_filter_sub_accelerated, imageIO.png.undo_filter_up_accelerated,
+                   imageIO.png.undo_filter_average_accelerated,
+                   imageIO.png.undo_filter_paeth_accelerated)[filter_type]
+
+    for length in (filter_unit, 5 * filter_unit, 97 * filter_unit):
+        scanline = bytearray(generator.randrange(256) for i in range(length))
+        previous = bytearray(generator.randrange(256) for i in range(length))
+        expected = bytearray(scanline)
+        plain(filter_unit, scanline, previous, expected)
+        result = bytearray(scanline)
+        accelerated(filter_unit, scanline, previous, result)
+        assert result == expected
+
+
+@pytest.mark.parametrize("filter_type", [0, 1, 2, 3, 4, 'adaptive'])
+def test_accelerated_reader_decodes_like_plain_reader(filter_type):
+    (image_width, image_height) = (29, 21)
+    rows = syntheticRGBRows(image_width, image_height, 6)
+    data = writePNG(rows, image_width, image_height, greyscale=False, filter_type=filter_type)
+
+    plain_reader = imageIO.png.Reader(bytes=data)
+    plain_reader.accelerated_filters = False
+    expected = [bytes(row) for row in plain_reader.read()[2]]
+    assert expected == [bytes(row) for row in rows]
+    assert [bytes(row) for row in imageIO.png.Reader(bytes=data).read()[2]] == expected
+
+
+@pytest.mark.parametrize("method", ["read", "read_flat", "read_packed", "read_planes", "read_greyscale"])
+def test_decompression_bomb_is_rejected(method):
+    # 10 MB of zeros compress to about 10 KB, but the header only declares 4 x (1 + 4) bytes
+    data = decompressionBomb(4, 4, 10 ** 7)
+    with pytest.raises(imageIO.png.FormatError):
+        (width, height, pixels, info) = getattr(imageIO.png.Reader(bytes=data), method)()
+        list(pixels)
+
+
+def test_max_pixels_rejects_large_headers():
+    data = writePNG(gradientRows(8, 8, planes=1), 8, 8, greyscale=True)
+
+    reader = imageIO.png.Reader(bytes=data)
+    reader.max_pixels = 63
+    with pytest.raises(imageIO.png.FormatError):
+        reader.read()
+
+    reader = imageIO.png.Reader(bytes=data)
+    reader.max_pixels = 64
+    assert [bytes(row) for row in reader.read()[2]] == [bytes(row) for row in gradientRows(8, 8, planes=1)]
+
+
+@pytest.mark.parametrize("filter_type", ['fast', 'adaptive', 'size'])
+@pytest.mark.parametrize("threads", [None, 3])
+@pytest.mark.parametrize("planes, bitdepth", [(3, 8), (1, 16), (1, 2)])
+def test_filter_heuristics_round_trip(filter_type, threads, planes, bitdepth):
+    (image_width, image_height) = (23, 19)
+    generator = random.Random(bitdepth)
+    rows = [[(3 * x + y + generator.randrange(4)) % 2 ** bitdepth for x in range(planes * image_width)]
+            for y in range(image_height)]
+    data = writePNG(rows, image_width, image_height, greyscale=planes == 1, bitdepth=bitdepth,
+                    filter_type=filter_type, threads=threads)
+    assert [list(row) for row in imageIO.png.Reader(bytes=data).read()[2]] == rows
+
+
+def test_size_is_never_larger_than_any_single_strategy():
+    (image_width, image_height) = (64, 48)
+    rows = syntheticRGBRows(image_width, image_height, 12)
+    sizes = [len(writePNG(rows, image_width, image_height, greyscale=False, filter_type=filter_type))
+             for filter_type in (0, 1, 2, 3, 4, 'adaptive')]
+
+    for threads in (None, 2):
+        data = writePNG(rows, image_width, image_height, greyscale=False, filter_type='size', threads=threads)
+        assert len(data) == min(sizes)
+        assert [bytes(row) for row in imageIO.png.Reader(bytes=data).read()[2]] == [bytes(row) for row in rows]
+
+
+def test_unknown_filter_type_is_rejected():
+    with pytest.raises(imageIO.png.ProtocolError):
+        imageIO.png.Writer(4, 4, greyscale=True, filter_type='fastest')
+
+
+def idatData(data):
+    return [bytes(content) for (chunk_type, content) in imageIO.png.Reader(bytes=data).chunks()
+            if chunk_type == b'IDAT']
+
+
+@pytest.mark.parametrize("level", [-1, 0, 1, 2, 5, 6, 7, 9])
+def test_zlib_header_matches_zlib(level):
+    assert imageIO.png.zlib_header(level) == zlib.compress(b'png', level)[:2]
+
+
+def test_adler32_combine_matches_adler32_of_concatenation():
+    generator = random.Random(13)
+    data = bytes(generator.randrange(256) for i in range(200000))
+    # the boundaries include empty blocks and a second block longer than the Adler-32 modulus 65521
+    for (start, split, end) in ((0, 0, 10), (0, 10, 10), (0, 1, 70000), (5, 100000, 200000), (0, 133000, 200000)):
+        (first, second) = (data[start:split], data[split:end])
+        combined = imageIO.png.adler32_combine(zlib.adler32(first), zlib.adler32(second), len(second))
+        assert combined == zlib.adler32(first + second)
+
+
+@pytest.mark.parametrize("threads", [2, 4])
+def test_threaded_writing_joins_one_zlib_stream(threads):
+    (image_width, image_height) = (150, 100)
+    rows = syntheticRGBRows(image_width, image_height, 14)
+    # a small chunk_limit splits the 45 KB of scanlines into a dozen segments, one IDAT chunk each
+    keywords = dict(greyscale=False, filter_type=1, chunk_limit=4096)
+    data = writePNG(rows, image_width, image_height, threads=threads, **keywords)
+    serial = writePNG(rows, image_width, image_height, **keywords)
+
+    chunks = idatData(data)
+    assert len(chunks) > 1
+    # zlib.decompress checks the header and the combined Adler-32 checksum at the end of the stream
+    assert zlib.decompress(b''.join(chunks)) == zlib.decompress(b''.join(idatData(serial)))
+    assert [bytes(row) for row in imageIO.png.Reader(bytes=data).read()[2]] == [bytes(row) for row in rows]
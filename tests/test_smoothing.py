@@ -0,0 +1,43 @@
+import QRCodeDetection
+from PixelArray import PixelArray
+from SyntheticImages import randomImage
+
+
+# The fused repeated box averaging against the repeated 3x3 passes it replaces, and the box filters against
+# computeBoxAveraging3x3.
+
+
+def test_fused_smoothing_stays_close_to_repeated_passes():
+    (image_width, image_height, repeat) = (31, 26, 4)
+    pixel_array = randomImage(image_width, image_height, 5)
+
+    expected = QRCodeDetection.computeBoxAveraging3x3Passes(pixel_array, image_width, image_height, repeat)
+    fused = QRCodeDetection.computeRepeatedBoxAveraging3x3(pixel_array, image_width, image_height, repeat)
+
+    for (expected_row, fused_row) in zip(expected, fused):
+        for (expected_value, fused_value) in zip(expected_row, fused_row):
+            assert abs(expected_value - fused_value) <= 0.0005 * (repeat + 1) + 1e-9
+
+
+def test_running_sum_box_filter_matches_3x3_average():
+    (image_width, image_height) = (17, 12)
+    pixel_array = randomImage(image_width, image_height, 6)
+
+    expected = QRCodeDetection.computeBoxAveraging3x3(pixel_array, image_width, image_height)
+    box = QRCodeDetection.computeBoxAveraging(pixel_array, image_width, image_height, kernel_size=3)
+
+    for (expected_row, box_row) in zip(expected, box):
+        for (expected_value, box_value) in zip(expected_row, box_row):
+            assert abs(expected_value - box_value) <= 0.001
+
+
+def test_detect_qr_smooths_with_repeated_passes_by_default():
+    (image_width, image_height) = (24, 20)
+    pixel_array = PixelArray(image_width, image_height, 'B')
+    for y in range(image_height):
+        pixel_array[y][:] = bytes((7 * x * y + 13 * x) % 256 for x in range(image_width))
+
+    result = QRCodeDetection.detect_qr(pixel_array, smoothing_repeat=3, keep_intermediates=True)
+    edge_magnitude = result.intermediates["edge_magnitude"]
+    expected = QRCodeDetection.computeBoxAveraging3x3Passes(edge_magnitude, image_width, image_height, 3)
+    assert result.intermediates["smoothed"].tolist() == expected.tolist()
@@ -0,0 +1,33 @@
+import BinaryImage
+import QRCodeDetection
+import StreamingDetection
+from SyntheticImages import randomBinaryImage, syntheticRGBRows, writeRGBImage
+
+
+# The streaming pipeline against detect_qr with the same (fused) smoothing, and its row generators against the
+# whole-image BinaryImage morphology they share the per-row operations with.
+
+
+def test_streaming_detection_matches_detect_qr(tmp_path):
+    (image_width, image_height) = (48, 40)
+    rows = syntheticRGBRows(image_width, image_height, 8)
+    filename = str(tmp_path / "image.png")
+    writeRGBImage(filename, rows, image_width, image_height)
+
+    for smoothing_repeat in (1, 3):
+        result = QRCodeDetection.detect_qr(filename, smoothing_repeat=smoothing_repeat, fused_smoothing=True)
+        (bounding_box, component_size) = StreamingDetection.detectQRCodeStreaming(filename,
+                                                                                  smoothing_repeat=smoothing_repeat)
+        assert bounding_box == result.bounding_box
+        assert component_size == result.component_size
+
+
+def test_morphology_rows_match_binary_image():
+    for (image_width, image_height) in ((23, 17), (1, 5), (9, 1)):
+        pixel_array = randomBinaryImage(image_width, image_height, image_width + image_height)
+        binary_image = BinaryImage.BinaryImage.fromPixelArray(pixel_array, image_width, image_height)
+
+        dilated = list(StreamingDetection.dilationRows(iter(binary_image.rows), image_width))
+        assert dilated == binary_image.dilate3x3().rows
+        eroded = list(StreamingDetection.erosionRows(iter(binary_image.rows), image_width))
+        assert eroded == binary_image.erode3x3().rows
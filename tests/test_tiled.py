@@ -0,0 +1,54 @@
+import multiprocessing
+
+import pytest
+
+import QRCodeDetection
+import TiledExecution
+from SyntheticImages import randomBinaryImage, randomImage
+
+
+# Stages run on bands with halo rows against the same stages run serially on the whole image; the stitched results
+# have to be identical. One pool is shared by all tests, with more processes than this machine may have cores so
+# that the images are always split into several bands.
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with multiprocessing.Pool(3) as pool:
+        yield pool
+
+
+def rows(pixel_array, image_height):
+    return [list(pixel_array[height]) for height in range(image_height)]
+
+
+def test_single_stage_matches_serial(pool):
+    (image_width, image_height) = (21, 17)
+    pixel_array = randomImage(image_width, image_height, 9)
+    expected = QRCodeDetection.computeBoxAveraging3x3(pixel_array, image_width, image_height)
+    tiled = TiledExecution.runStageTiled(QRCodeDetection.computeBoxAveraging3x3, pixel_array, image_width,
+                                         image_height, processes=3, pool=pool)
+    assert rows(tiled, image_height) == rows(expected, image_height)
+
+
+def test_stage_chain_matches_serial(pool):
+    (image_width, image_height) = (19, 23)
+    pixel_array = randomBinaryImage(image_width, image_height, 10, density=0.6)
+    stages = [QRCodeDetection.computeDilation8Nbh3x3FlatSE, QRCodeDetection.computeErosion8Nbh3x3FlatSE,
+              QRCodeDetection.computeErosion8Nbh3x3FlatSE]
+    expected = pixel_array
+    for stage in stages:
+        expected = stage(expected, image_width, image_height)
+    tiled = TiledExecution.runStagesTiled(stages, pixel_array, image_width, image_height, output_typecode='B',
+                                          processes=3, pool=pool)
+    assert rows(tiled, image_height) == rows(expected, image_height)
+
+
+@pytest.mark.parametrize("repeat", [1, 4])
+def test_repeated_box_averaging_matches_serial(pool, repeat):
+    (image_width, image_height) = (17, 20)
+    pixel_array = randomImage(image_width, image_height, 11)
+    expected = QRCodeDetection.computeRepeatedBoxAveraging3x3(pixel_array, image_width, image_height, repeat)
+    tiled = TiledExecution.computeRepeatedBoxAveraging3x3Tiled(pixel_array, image_width, image_height, repeat,
+                                                               processes=3, pool=pool)
+    assert rows(tiled, image_height) == rows(expected, image_height)